@@ -1,8 +1,21 @@
 from dotenv import load_dotenv
+import asyncio
 import chainlit as cl
 import json
-from movie_functions import get_now_playing_movies, get_showtimes, get_reviews, buy_ticket
 import re
+import time
+from movie_functions import get_now_playing_movies_async, get_showtimes, get_reviews_async, buy_ticket, get_cached_catalog, get_catalog_version
+from movie_functions import get_catalog_stats, get_review_cache_stats, get_showtime_cache_stats
+from tool_runner import run_tool
+from json_stream import JSONStreamExtractor
+from review_intent import build_title_index, classify_review_intent
+from history_manager import HistoryManager
+from conversation_digest import ConversationDigest
+from tokens import preload_encoding, record_usage, usage_stats
+from tool_encoding import get_encoding_stats
+from response_cache import ResponseCache
+from session_store import SessionStore
+from metrics import timed, record_llm_call, record_cache_lookup, record_parse_errors, record_function_call_iterations, register_stats, start_metrics_server
 
 load_dotenv()
 
@@ -16,6 +29,27 @@ from langfuse.openai import AsyncOpenAI
  
 client = AsyncOpenAI()
 
+# Keeps message_history within HISTORY_TOKEN_BUDGET tokens across long sessions.
+history_manager = HistoryManager()
+# Token counts are estimated until tiktoken's encoding has loaded in the background.
+preload_encoding()
+
+# How many movies' review CONTEXT blocks are kept at the tail of requests.
+REVIEW_CONTEXT_MAX_MOVIES = 2
+
+# Whole-turn cache for common opening questions ("what's playing?").
+response_cache = ResponseCache()
+
+# Prometheus metrics on METRICS_PORT (or the next free port for later workers);
+# cache stats are read at scrape time.
+register_stats("catalog", get_catalog_stats)
+register_stats("reviews", get_review_cache_stats)
+register_stats("showtimes", get_showtime_cache_stats)
+register_stats("response_cache", response_cache.stats)
+register_stats("tool_encoding", get_encoding_stats)
+register_stats("llm_usage", lambda: {f"{label}_{key}": value for label, stats in usage_stats.items() for key, value in stats.items()})
+start_metrics_server()
+
 gen_kwargs = {
     "model": "gpt-4o",
     "temperature": 0.2,
@@ -25,6 +59,7 @@ gen_kwargs = {
 SYSTEM_PROMPT = """\
 You are a helpful assistant in providing movie recommendations and helping users select movies by answering their questions and providing 
 necessary information.
+If you need several independent function calls (for example showtimes for more than one movie), output all of them in the same response.
 If the user asks for the list of movies currently playing or if you need this list to help answer questions, output a function call formatted like this:
 
 {
@@ -70,6 +105,7 @@ confirms, generate a second function call to make the purchase.
 SYSTEM_PROMPT_ALT = """\
 You are a helpful assistant in providing movie recommendations and helping users select movies by answering their questions and providing 
 necessary information.
+If you need several independent function calls (for example showtimes for more than one movie), output all of them in the same response.
 If the user asks for the list of movies currently playing or if you need this list to help answer questions, output a function call formatted like this:
 
 {
@@ -110,7 +146,7 @@ If the user wishes to confirm a ticket purchase for a specified movie, theater a
 """
 
 SYSTEM_PROMPT_FOR_REVIEWS_INTENT = """
-Based on the conversation, determine if the topic is about a specific movie. Determine if the user is asking a question that would be aided by knowing what critics are saying about the movie. Determine if the reviews for that movie have already been provided in the conversation. If so, do not fetch reviews.
+Based on the conversation digest, determine if the topic is about a specific movie. Determine if the user is asking a question that would be aided by knowing what critics are saying about the movie. Determine if the reviews for that movie have already been provided in the conversation. If so, do not fetch reviews.
 
 Your only role is to evaluate the conversation, and decide whether to fetch reviews.
 
@@ -125,11 +161,58 @@ rationale. Do not output as a code block.
 }
 """
 
+# message_history lives in the session store (an in-memory LRU over SQLite)
+# rather than in cl.user_session, so idle sessions don't pin worker memory and
+# any worker can continue a session. The system prompt every session starts
+# with doubles as the compression dictionary.
+session_store = SessionStore(zdict=SYSTEM_PROMPT.encode("utf-8"))
+register_stats("sessions", session_store.stats)
+
+class SessionState:
+    """Per-session state stored next to message_history in the session store.
+
+    It is loaded at the start of every turn and saved with the history, so
+    the stored copy is the latest whichever worker served the last turn.
+    """
+
+    def __init__(self, review_context=None, digest=None):
+        # str(movie_id) -> review CONTEXT, oldest first (see with_review_context).
+        self.review_context = review_context or {}
+        self.digest = digest or ConversationDigest()
+
+    @classmethod
+    def from_extras(cls, extras):
+        return cls(extras.get("review_context"), ConversationDigest.from_dict(extras.get("digest")))
+
+    def to_extras(self):
+        extras = {"digest": self.digest.to_dict()}
+        if self.review_context:
+            extras["review_context"] = self.review_context
+        return extras
+
+async def load_session():
+    # (message_history, SessionState) for this turn.
+    message_history, extras = await session_store.load(cl.user_session.get("id"))
+    if message_history is None:
+        return [{"role": "system", "content": SYSTEM_PROMPT}], SessionState()
+    return message_history, SessionState.from_extras(extras)
+
+async def load_message_history():
+    return (await load_session())[0]
+
+async def save_session(message_history, state):
+    await session_store.save(cl.user_session.get("id"), message_history, state.to_extras())
+
 @observe
 @cl.on_chat_start
-def on_chat_start():    
+async def on_chat_start():    
     message_history = [{"role": "system", "content": SYSTEM_PROMPT}]
-    cl.user_session.set("message_history", message_history)
+    await save_session(message_history, SessionState())
+
+@cl.on_chat_end
+def on_chat_end():
+    # Free the memory tier; the stored copy stays for a reconnect to any worker.
+    session_store.release(cl.user_session.get("id"))
 
 @observe
 async def generate_response(client, message_history, gen_kwargs):
@@ -144,8 +227,11 @@ async def generate_response(client, message_history, gen_kwargs):
     await response_message.update()
     return response_message
 
-async def generate_llmresponse(client, message_history, gen_kwargs):
+async def generate_llmresponse(client, message_history, gen_kwargs, usage_label="completion"):
+    started = time.perf_counter()
     llm_response = await client.chat.completions.create(messages=message_history, stream=False, **gen_kwargs)
+    record_llm_call(usage_label, time.perf_counter() - started)
+    record_usage(usage_label, llm_response.usage if llm_response else None)
     # Extract the assistant's response
     if llm_response and llm_response.choices[0]:
         message_content = llm_response.choices[0].message.content
@@ -153,33 +239,92 @@ async def generate_llmresponse(client, message_history, gen_kwargs):
    
     return None
 
-def extract_json(text):
-    # Regular expression to capture JSON-like objects
-    json_regex = r'(\{[^{}]*\})'
-
-    # Find the first match
-    matches = re.search(json_regex, text)
-
-    if matches:
-            # Get the prefix, json string, and postfix
-        json_str = matches.group(1)
-        prefix = text[:matches.start()]
-        postfix = text[matches.end():]
-        
+class StreamedCompletion:
+    # One streamed chat completion. Prose is streamed straight into a
+    # cl.Message; from the first JSON object or ``` fence onwards text is held
+    # back, since it may be a function call that should be dispatched rather
+    # than shown. While `released` is False nothing reaches the UI (used for
+    # speculation).
+
+    def __init__(self, released=True):
+        self.usage = None
+        self.message = None
+        self.released = released
+        self.function_calls = []
+        # id(function_call) -> task for lookups dispatched while still streaming.
+        self.started_calls = {}
+        self._extractor = JSONStreamExtractor()
+        self._sent = 0
+
+    @property
+    def text(self):
+        return self._extractor.text
+
+    async def run(self, client, message_history, gen_kwargs):
+        started = time.perf_counter()
+        first_token = None
+        stream = await client.chat.completions.create(
+            messages=message_history, stream=True, stream_options={"include_usage": True}, **gen_kwargs
+        )
         try:
-            # Parse the matched JSON string into a Python dictionary
-            json_obj = json.loads(json_str)
-            print("Prefix:", prefix)
-            prefix = prefix.replace("```json", "")
-            print("Extracted JSON string:", json_str)
-            print("Postfix:", postfix)
-            print("Parsed JSON object:", json_obj)
-            return (prefix, json_obj, postfix)
-        except json.JSONDecodeError:
-            print("Matched string is not a valid JSON object")
-    else:
-        print("No JSON object found")
-    return (None, None, None)
+            async for part in stream:
+                if part.usage:
+                    self.usage = part.usage
+                if part.choices and (token := part.choices[0].delta.content or ""):
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    for function_call in self._extractor.feed(token):
+                        # Start read-only lookups as soon as their JSON closes.
+                        if function_call.get("function_name") in PARALLEL_FUNCTIONS:
+                            self.started_calls[id(function_call)] = asyncio.ensure_future(execute_function_call(function_call))
+                    await self.flush()
+        except BaseException:
+            self.cancel_started_calls()
+            raise
+        finally:
+            await stream.close()
+        # Objects only found by rescanning past an unclosed "{" run with the rest.
+        self._extractor.close()
+        record_llm_call("completion", time.perf_counter() - started, first_token)
+        record_parse_errors(self._extractor.parse_errors)
+        record_usage("completion", self.usage)
+        self.function_calls = self._extractor.function_calls()
+        if not self.function_calls:
+            await self.flush(final=True)
+        return self
+
+    def _sendable_end(self):
+        starts = [i for i in (self._extractor.first_object_start, self._extractor.first_fence_start) if i is not None]
+        if starts:
+            return min(starts)
+        return self._extractor.length - self._extractor.pending_backticks
+
+    async def flush(self, final=False):
+        if not self.released:
+            return
+        end = self._extractor.length if final else self._sendable_end()
+        if end > self._sent:
+            token = self._extractor.slice(self._sent, end)
+            self._sent = end
+            if self.message is None:
+                self.message = cl.Message(content="")
+            await self.message.stream_token(token)
+
+    def cancel_started_calls(self):
+        for task in self.started_calls.values():
+            task.cancel()
+
+    async def post(self, message_history):
+        # Show whatever is still held back and finalize the message.
+        self.released = True
+        await self.flush(final=True)
+        if self.message is None:
+            self.message = cl.Message(content=self.text)
+        await self.message.send()
+        message_history.append({"role": "assistant", "content": self.text})
+
+async def stream_llmresponse(client, message_history, gen_kwargs, state):
+    return await StreamedCompletion().run(client, with_review_context(message_history, state), gen_kwargs)
 
 # Extract function call parsing into a separate function
 def parse_function_call(content):
@@ -219,15 +364,69 @@ async def confirm_ticket_purchase(theater, movie, showtime):
         return "Confirmed"
     return None
 
-async def should_fetch_movie_reviews(client, message_history, gen_kwargs):
-    temp_history = message_history[1:]
-    new_prompt = f"""{SYSTEM_PROMPT_FOR_REVIEWS_INTENT} 
-    Conversation History:
-           {temp_history}
-    End of conversation history.
-    """
-    new_history = [{"role": "system", "content": new_prompt}]
-    response = await generate_llmresponse(client, new_history, gen_kwargs)
+# Function calls without side effects or user interaction; these may run concurrently.
+PARALLEL_FUNCTIONS = {"get_movies", "get_showtimes", "get_reviews"}
+
+async def execute_function_call(function_call):
+    # Returns the text to add to message_history, or None for unknown functions.
+    if function_call["function_name"] == "get_movies":
+        movies = await run_tool("get_movies", get_now_playing_movies_async, encoding="compact")
+        return f"Here are the current movies: {movies}"
+    elif function_call["function_name"] == "get_showtimes":
+        showtimes = await run_tool("get_showtimes", get_showtimes, function_call["movie_name"], function_call["location"])
+        return f"Showtimes for {function_call['movie_name']} in {function_call['location']}: {showtimes}"
+    elif function_call["function_name"] == "get_reviews":
+        # Marked as reviewed by the caller once the result is in message_history.
+        reviews = await run_tool("get_reviews", get_reviews_async, function_call["movie_id"], encoding="compact")
+        return f"Reviews for the movie (ID: {function_call['movie_id']}): {reviews}"
+    elif function_call["function_name"] == "confirm_ticket_purchase":
+        movie = function_call["movie"]
+        theater = function_call["theater"]
+        showtime = function_call["showtime"]
+        confirmation = await confirm_ticket_purchase(theater, movie, showtime)
+        if confirmation:
+            print("User confirmed.")
+            return f"User confirmed the movie purchase: {movie} at theater {theater} for showtime f{showtime}. Proceed for purchase."
+        print("User cancelled.")
+        return f"User cancelled the movie purchase: {movie} at theater {theater} for showtime f{showtime}. Ask the user if there interest in any other movie ?"
+    elif function_call["function_name"] == "buy_ticket":
+        reviews = await run_tool("buy_ticket", buy_ticket, function_call["theater"], function_call["movie"], function_call["showtime"])
+        movie_data_message = await cl.Message(f"Reviews for the movie: {reviews}").send()
+        return movie_data_message.content
+    return None
+
+async def execute_function_calls(function_calls, started_calls=None):
+    # Independent lookups run together with asyncio.gather (some may already
+    # have been started while the response streamed); confirmations and
+    # purchases then run one at a time. Results keep the order of the calls.
+    tasks = {}
+    for function_call in function_calls:
+        if function_call["function_name"] in PARALLEL_FUNCTIONS:
+            task = (started_calls or {}).get(id(function_call))
+            tasks[id(function_call)] = task or asyncio.ensure_future(execute_function_call(function_call))
+    await asyncio.gather(*tasks.values())
+
+    results = []
+    for function_call in function_calls:
+        if id(function_call) in tasks:
+            result = tasks[id(function_call)].result()
+        else:
+            result = await execute_function_call(function_call)
+        if result:
+            results.append(result)
+    return results
+
+async def should_fetch_movie_reviews(client, digest, gen_kwargs):
+    # Only the bounded ConversationDigest is sent, so the cost of this check
+    # stays constant per turn instead of growing with the session. The static
+    # instructions come first, byte-identical on every call, so the provider
+    # can cache them; the digest goes last.
+    new_history = [
+        {"role": "system", "content": SYSTEM_PROMPT_FOR_REVIEWS_INTENT},
+        {"role": "user", "content": f"Conversation digest:\n{digest.render()}\nEnd of conversation digest."},
+    ]
+    with timed("intent_check"):
+        response = await generate_llmresponse(client, new_history, gen_kwargs, usage_label="review_intent")
     print("--------> Should fetch reviews: ", response)
     try:
         review_json = json.loads(response)
@@ -238,79 +437,209 @@ async def should_fetch_movie_reviews(client, message_history, gen_kwargs):
     return None
 
 
-@cl.on_message
-@observe
-async def on_message(message: cl.Message):
-    message_history = cl.user_session.get("message_history", [])
-    message_history.append({"role": "user", "content": message.content})
+def mark_reviews_fetched(state, movie_id, title=None):
+    # Record which movies already have reviews in message_history, for both intent checks.
+    state.digest.observe_reviews(movie_id, title)
+
+# Start of a verbatim get_reviews result in message_history.
+REVIEWS_RESULT_PATTERN = re.compile(r"^Reviews for the movie \(ID: ([^)]*)\):")
+
+def forget_reviews(state, movie_id, message_history):
+    # Called when a movie's reviews leave the request (CONTEXT evicted or the
+    # tool output summarized); they count as provided only while some copy remains.
+    movie_id = str(movie_id)
+    if movie_id in state.review_context:
+        return
+    for message in message_history:
+        match = REVIEWS_RESULT_PATTERN.match(message["content"] or "") if message["role"] == "system" else None
+        if match and match.group(1) == movie_id:
+            return
+    state.digest.forget_reviews(movie_id)
+
+def forget_summarized_reviews(state, message_history):
+    def on_summarize(content):
+        match = REVIEWS_RESULT_PATTERN.match(content)
+        if match:
+            forget_reviews(state, match.group(1), message_history)
+    return on_summarize
+
+async def append_review_context(state, review_json, message_history):
+    # Review CONTEXT is kept out of message_history and appended at the tail
+    # of each request (see with_review_context). Splicing it into the history
+    # would change the prompt prefix and defeat provider prefix caching.
+    movie_id = review_json.get("id")
+    reviews = await run_tool("get_reviews", get_reviews_async, movie_id, encoding="compact")
+    reviews = f"Reviews for {review_json.get('movie')} (ID: {movie_id}):\n\n{reviews}"
+    review_context = state.review_context
+    review_context.pop(str(movie_id), None)
+    review_context[str(movie_id)] = f"CONTEXT: {reviews}"
+    evicted = []
+    while len(review_context) > REVIEW_CONTEXT_MAX_MOVIES:
+        evicted.append(next(iter(review_context)))
+        review_context.pop(evicted[-1])
+    for evicted_id in evicted:
+        forget_reviews(state, evicted_id, message_history)
+    mark_reviews_fetched(state, movie_id, review_json.get("movie"))
+
+def with_review_context(message_history, state):
+    # The request sent to the model: the append-only history (a stable,
+    # cacheable prefix) followed by the dynamic review context.
+    if not state.review_context:
+        return message_history
+    return message_history + [{"role": "system", "content": "\n\n".join(state.review_context.values())}]
+
+# Counters for the speculative pipeline in generate_speculative_response.
+speculation_stats = {
+    "turns": 0,
+    "reviews_needed": 0,
+    "speculation_used": 0,
+    "speculation_cancelled": 0,
+    "speculation_discarded": 0,
+    "wasted_prompt_tokens": 0,
+    "wasted_completion_tokens": 0,
+    "local_decisions": 0,
+}
 
-    review_json = await should_fetch_movie_reviews(client, message_history, gen_kwargs)
-    if review_json and review_json["fetch_reviews"] == True:
-        movie_id = review_json.get("id")
-        reviews = get_reviews(movie_id)
-        reviews = f"Reviews for {review_json.get('movie')} (ID: {movie_id}):\n\n{reviews}"
-        context_message = {"role": "system", "content": f"CONTEXT: {reviews}"}
-        message_history.append(context_message)        
+def get_speculation_stats():
+    stats = dict(speculation_stats)
+    turns = stats["turns"] or 1
+    stats["reviews_needed_rate"] = stats["reviews_needed"] / turns
+    stats["speculation_wasted_rate"] = (stats["speculation_cancelled"] + stats["speculation_discarded"]) / turns
+    return stats
+
+register_stats("speculation", get_speculation_stats)
+
+async def generate_first_response(client, message_history, gen_kwargs, state):
+    # Obvious turns are decided locally without an intent LLM call; only
+    # ambiguous ones go through the speculative LLM intent check.
+    title_index = build_title_index(get_cached_catalog())
+    review_json = classify_review_intent(message_history[-1]["content"], title_index, state.digest.reviewed_ids)
+    if review_json is None:
+        return await generate_speculative_response(client, message_history, gen_kwargs, state)
+
+    speculation_stats["local_decisions"] += 1
+    if review_json["fetch_reviews"]:
+        with timed("review_context"):
+            await append_review_context(state, review_json, message_history)
+    return await stream_llmresponse(client, message_history, gen_kwargs, state)
+
+def abandon_task(task):
+    # Cancel a task whose result is no longer wanted and retrieve its outcome
+    # when it finishes, so a failure doesn't surface as "never retrieved".
+    task.cancel()
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+async def generate_speculative_response(client, message_history, gen_kwargs, state):
+    # Start the review-intent check and the main completion at the same time.
+    # The main completion streams into a buffer that is only released to the
+    # UI once we know reviews aren't needed. Otherwise it is cancelled (or
+    # discarded if it already finished) and restarted with the review CONTEXT.
+    speculative_history = with_review_context(list(message_history), state)
+    completion = StreamedCompletion(released=False)
+    main_task = asyncio.create_task(completion.run(client, speculative_history, gen_kwargs))
+    try:
+        review_json = await should_fetch_movie_reviews(client, state.digest, gen_kwargs)
+    except BaseException:
+        abandon_task(main_task)
+        raise
+
+    speculation_stats["turns"] += 1
+    if review_json and review_json.get("fetch_reviews") == True:
+        speculation_stats["reviews_needed"] += 1
+        if main_task.done() and not main_task.cancelled() and main_task.exception() is None:
+            completion.cancel_started_calls()
+            speculation_stats["speculation_discarded"] += 1
+            if completion.usage:
+                speculation_stats["wasted_prompt_tokens"] += completion.usage.prompt_tokens
+                speculation_stats["wasted_completion_tokens"] += completion.usage.completion_tokens
+        else:
+            abandon_task(main_task)
+            speculation_stats["speculation_cancelled"] += 1
+        with timed("review_context"):
+            await append_review_context(state, review_json, message_history)
+        return await stream_llmresponse(client, message_history, gen_kwargs, state)
 
-    # Determine if there is an indirect semantic intent to fetch reviews.
+    speculation_stats["speculation_used"] += 1
+    completion.released = True
+    await completion.flush()
+    return await main_task
 
-    # response_message = await generate_response(client, message_history, gen_kwargs)
-    # message_history.append({"role": "assistant", "content": response_message.content})
+@cl.on_message
+@observe
+async def on_message(message: cl.Message):
+    with timed("turn"):
+        await handle_message(message)
 
-    llm_response = await generate_llmresponse(client, message_history, gen_kwargs)
-    print("llm_response 2 = ", llm_response)
+async def handle_message(message):
+    # The stored session is the latest, even if this worker served it before.
+    message_history, state = await load_session()
+    message_history.append({"role": "user", "content": message.content})
+    state.digest.observe_user(message.content, build_title_index(get_cached_catalog()))
+    with timed("history_compact"):
+        history_manager.compact(message_history, on_summarize=forget_summarized_reviews(state, message_history))
+
+    catalog_version = get_catalog_version()
+    cache_key = response_cache.fingerprint(SYSTEM_PROMPT, message_history, gen_kwargs, catalog_version)
+    cached_turn = response_cache.get(cache_key, catalog_version) if cache_key else None
+    if cache_key:
+        record_cache_lookup("response", cached_turn is not None)
+    if cached_turn:
+        message_history.extend(cached_turn["messages"])
+        # The replayed turn may carry get_reviews results; record them as live fetches are.
+        for cached_message in cached_turn["messages"]:
+            match = REVIEWS_RESULT_PATTERN.match(cached_message["content"] or "") if cached_message["role"] == "system" else None
+            if match:
+                mark_reviews_fetched(state, match.group(1))
+        with timed("post"):
+            await post_llmresponse(cached_turn["text"], message_history, gen_kwargs)
+        state.digest.observe_assistant(cached_turn["text"], build_title_index(get_cached_catalog()))
+        await save_session(message_history, state)
+        return
+    turn_start = len(message_history)
+    called_functions = set()
+
+    # Determine if there is an indirect semantic intent to fetch reviews, locally
+    # when obvious, otherwise while the main completion runs speculatively.
+    with timed("first_response"):
+        completion = await generate_first_response(client, message_history, gen_kwargs, state)
     continue_function_calls = True
     function_call_parsing_count = 0
-    last_llm_response = llm_response
     while (continue_function_calls and function_call_parsing_count < 10):
-        # Parse message.content to check for function call output by OpenAI GPT
-        #function_call = parse_function_call(llm_response)
-        (prefix, json_obj, postfix) = extract_json(llm_response)
-        function_call =  json_obj if json_obj and "function_name" in json_obj else None
-        movie_data_message = None
-        if function_call:
-            # Handle the function call
-            if function_call["function_name"] == "get_movies":
-                movies = get_now_playing_movies()
-                #movie_data_message = await cl.Message(f"Here are the current movies: {movies}").send()
-                movie_data_message = cl.Message(f"Here are the current movies: {movies}")
-            elif function_call["function_name"] == "get_showtimes":
-                showtimes = get_showtimes(function_call["movie_name"], function_call["location"])
-                #movie_data_message = await cl.Message(f"Showtimes for {function_call['movie_name']} in {function_call['location']}: {showtimes}").send()
-                movie_data_message = cl.Message(f"Showtimes for {function_call['movie_name']} in {function_call['location']}: {showtimes}")
-            elif function_call["function_name"] == "get_reviews":
-                reviews = get_reviews(function_call["movie_id"])
-                #movie_data_message = await cl.Message(f"Reviews for the movie: {reviews}").send()
-                movie_data_message = cl.Message(f"Reviews for the movie: {reviews}")
-            elif function_call["function_name"] == "confirm_ticket_purchase":
-                movie = function_call["movie"]
-                theater = function_call["theater"]
-                showtime = function_call["showtime"]
-                confirmation = await confirm_ticket_purchase(theater, movie, showtime)
-                if confirmation:
-                    print("User confirmed.")
-                    movie_data_message = cl.Message(f"User confirmed the movie purchase: {movie} at theater {theater} for showtime f{showtime}. Proceed for purchase.")
-                else:
-                    print("User cancelled.")
-                    movie_data_message = cl.Message(f"User cancelled the movie purchase: {movie} at theater {theater} for showtime f{showtime}. Ask the user if there interest in any other movie ?")
-            elif function_call["function_name"] == "buy_ticket":
-                reviews = buy_ticket(function_call["theater"], function_call["movie"], function_call["showtime"])
-                movie_data_message = await cl.Message(f"Reviews for the movie: {reviews}").send()
-            #if prefix:
-            #     await post_llmresponse(prefix, message_history, gen_kwargs)
-        if function_call and movie_data_message:
-            message_history.append({"role": "system", "content": movie_data_message.content})
-            # Get the next round of completions from OAI.
+        # Parse every function call the model emitted in this response and run
+        # them together, so N calls cost one extra LLM round trip instead of N.
+        function_calls = completion.function_calls
+        called_functions.update(function_call["function_name"] for function_call in function_calls)
+        with timed("function_calls"):
+            results = await execute_function_calls(function_calls, completion.started_calls) if function_calls else []
+        if results:
+            if completion.message is not None:
+                # Finalize any prose the model streamed before its function calls.
+                await completion.message.send()
+            for result in results:
+                message_history.append({"role": "system", "content": result})
+            for function_call in function_calls:
+                if function_call["function_name"] == "get_reviews":
+                    mark_reviews_fetched(state, function_call["movie_id"])
+            # Get the next round of completions from OAI, streaming any prose.
             function_call_parsing_count += 1
-            llm_response = await generate_llmresponse(client, message_history, gen_kwargs)
-            # llm_response = llm_response.choices[0].message.content
-            print("Generating next response:", llm_response)
+            with timed("followup_response"):
+                completion = await stream_llmresponse(client, message_history, gen_kwargs, state)
+            print("Generating next response:", completion.text)
         else:
             continue_function_calls = False
-        last_llm_response = llm_response
-
-    await post_llmresponse(last_llm_response, message_history, gen_kwargs)
-    cl.user_session.set("message_history", message_history)
+    record_function_call_iterations(function_call_parsing_count)
+
+    with timed("post"):
+        await completion.post(message_history)
+    state.digest.observe_assistant(completion.text, build_title_index(get_cached_catalog()))
+    await save_session(message_history, state)
+
+    # Only cache turns whose outcome doesn't depend on side effects, user
+    # confirmation or per-session review context.
+    if (cache_key and called_functions <= PARALLEL_FUNCTIONS
+            and not state.review_context
+            and get_catalog_version() == catalog_version):
+        response_cache.put(cache_key, {"messages": message_history[turn_start:-1], "text": completion.text}, catalog_version)
 
 if __name__ == "__main__":
     cl.main()
@@ -1,139 +1,72 @@
 
+import asyncio
 import os
-from io import BytesIO
+import time
 from pathlib import Path
 from typing import List
 
-from openai import AsyncAssistantEventHandler, AsyncOpenAI, OpenAI
+from openai import AsyncAssistantEventHandler, AsyncOpenAI, NotFoundError, OpenAI
 
 from literalai.helper import utc_now
 
 import chainlit as cl
 from chainlit.config import config
 from chainlit.element import Element
+from chainlit.server import app as chainlit_app
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+
+from assistant_registry import assistant_registry, get_assistant_async, is_missing_assistant
+from upload_cache import UPLOAD_CONCURRENCY, UploadStore, file_sha256
+from transcription import EncodedStreamTranscriber
+from image_cache import ImageCache, image_media_type
+from thread_pool import AssistantThreadPool, start_with_app
 
 
 async_openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 sync_openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
-ASSISTANT_INSTRUCTIONS = """\
-You are a helpful assistant in providing movie recommendations and helping users select movies by answering their questions and providing 
-necessary information. You are able to provide reviews, showtimes and also confirm and complete movie ticket purchases.
+# Pre-created threads, so a new chat doesn't wait on threads.create().
+# The pool fills when the server starts and is kept full from then on.
+thread_pool = AssistantThreadPool(async_openai_client)
+start_with_app(thread_pool, chainlit_app)
 
-"""
+async def get_or_create_assistant():
+    # An explicit OPENAI_ASSISTANT_ID wins; otherwise use the registered assistant.
+    if os.environ.get("OPENAI_ASSISTANT_ID"):
+        return await async_openai_client.beta.assistants.retrieve(os.environ.get("OPENAI_ASSISTANT_ID"))
+    return await get_assistant_async(async_openai_client)
 
-async def create_assistant():
-    assistant = await async_openai_client.beta.assistants.create(
-    instructions = ASSISTANT_INSTRUCTIONS,
-    model="gpt-4o",
-    tools=[
-        {
-        "type": "function",
-        "function": {
-            "name": "get_movies",
-            "description": "Get a list of movies currently playing. For each movie, it also returns a movie ID.",
-        }
-        },
-        {
-        "type": "function",
-        "function": {
-            "name": "get_showtimes",
-            "description": "Get the showtimes for a specific movie ID and a specific location.",
-            "parameters": {
-            "type": "object",
-            "properties": {
-                "location": {
-                "type": "string",
-                "description": "The city and state, e.g., San Francisco, CA"
-                },
-                "movie_id": {
-                "type": "string",
-                "description": "The ID of the movie. The ID is obtained from the get_movies() function call."
-                }
-            },
-            "required": ["location", "movie_id"]
-            }
-        }
-        },
-        {
-        "type": "function",
-        "function": {
-            "name": "get_reviews",
-            "description": "Get the reviews for a specific movie ID.",
-            "parameters": {
-            "type": "object",
-            "properties": {
-                "movie_id": {
-                "type": "string",
-                "description": "The ID of the movie. The ID is obtained from the get_movies() function call."
-                }
-            },
-            "required": ["movie_id"]
-            }
-        }
-        },
-        {
-        "type": "function",
-        "function": {
-            "name": "confirm_ticket_purchase",
-            "description": "Confirm purchase of a movie ticket for a specific movie, theater and showtime.",
-            "parameters": {
-            "type": "object",
-            "properties": {
-                "theater": {
-                "type": "string",
-                "description": "The name/location of the movie theater."
-                },
-                "movie": {
-                "type": "string",
-                "description": "Title of the movie."
-                },
-                "showtime": {
-                "type": "string",
-                "description": "Showtime for the movie at the given theater."
-                }
-            },
-            "required": ["theater", "movie", "showtime"]
-            }
-        }
-        },
-        {
-        "type": "function",
-        "function": {
-            "name": "buy_ticket",
-            "description": "Purchase of a movie ticket for a specific movie, theater and showtime.",
-            "parameters": {
-            "type": "object",
-            "properties": {
-                "theater": {
-                "type": "string",
-                "description": "The name/location of the movie theater."
-                },
-                "movie": {
-                "type": "string",
-                "description": "Title of the movie."
-                },
-                "showtime": {
-                "type": "string",
-                "description": "Showtime for the movie at the given theater."
-                }
-            },
-            "required": ["theater", "movie", "showtime"]
-            }
-        }
-        }
-    ]
-    )
-    return assistant
 
-async def get_or_create_assistant():
-    assistant = sync_openai_client.beta.assistants.retrieve(
-        os.environ.get("OPENAI_ASSISTANT_ID")
-    )
-    if not assistant:
-        assistant = await create_assistant()
-    return assistant
 
+IMAGE_ROUTE = "/assistant-images"
+
+
+async def download_openai_file(file_id, path):
+    async with async_openai_client.files.with_streaming_response.content(file_id) as response:
+        with open(path, "wb") as f:
+            async for chunk in response.iter_bytes():
+                f.write(chunk)
+
+
+image_cache = ImageCache(download_openai_file)
+
+
+@chainlit_app.get(IMAGE_ROUTE + "/{file_id}")
+async def serve_assistant_image(file_id: str, expires: int = 0, key: str = ""):
+    # Only unexpired links we issued are served; anything else is a 404, not
+    # a proxy to files.content.
+    if not image_cache.is_issued(file_id, expires, key):
+        raise HTTPException(status_code=404)
+    try:
+        path = await image_cache.get_path(file_id)
+    except (ValueError, NotFoundError):
+        raise HTTPException(status_code=404)
+    max_age = max(min(86400, expires - int(time.time())), 0)
+    return FileResponse(path, media_type=image_media_type(path), headers={"Cache-Control": f"private, max-age={max_age}"})
+
+# Chainlit serves its frontend from a catch-all route; ours must come first.
+chainlit_app.router.routes.insert(0, chainlit_app.router.routes.pop())
 
 
 class EventHandler(AsyncAssistantEventHandler):
@@ -193,11 +126,13 @@ class EventHandler(AsyncAssistantEventHandler):
         await self.current_step.update()
 
     async def on_image_file_done(self, image_file):
+        # Referenced by URL: the bytes are fetched (and cached on disk) when
+        # the browser first renders the image, not held in the session.
         image_id = image_file.file_id
-        response = await async_openai_client.files.with_raw_response.content(image_id)
+        expires, key = image_cache.issue(image_id)
         image_element = cl.Image(
             name=image_id,
-            content=response.content,
+            url=f"{IMAGE_ROUTE}/{image_id}?expires={expires}&key={key}",
             display="inline",
             size="large"
         )
@@ -207,23 +142,90 @@ class EventHandler(AsyncAssistantEventHandler):
         await self.current_message.update()
 
 
-@cl.step(type="tool")
-async def speech_to_text(audio_file):
+async def transcribe_with_whisper(filename, data):
     response = await async_openai_client.audio.transcriptions.create(
-        model="whisper-1", file=audio_file
+        model="whisper-1", file=(filename, data)
     )
-
     return response.text
 
 
+@cl.step(type="tool", name="speech_to_text")
+async def finish_transcription(transcriber: EncodedStreamTranscriber):
+    return await transcriber.finish()
+
+
+@cl.on_audio_chunk
+async def on_audio_chunk(chunk: cl.AudioChunk):
+    # The browser's recording (webm or mp4) is decoded and transcribed chunk
+    # by chunk while the user is still talking (see transcription.py).
+    if chunk.isStart:
+        filename = f"input_audio.{chunk.mimeType.split('/')[-1]}"
+        cl.user_session.set("audio_transcriber", EncodedStreamTranscriber(transcribe_with_whisper, filename))
+
+    await cl.user_session.get("audio_transcriber").feed(chunk.data)
+
+
+@cl.on_audio_end
+async def on_audio_end(elements: List[Element]):
+    transcription = await finish_transcription(cl.user_session.get("audio_transcriber"))
+    cl.user_session.set("audio_transcriber", None)
+
+    # Start the run as soon as the transcript is final.
+    message = cl.Message(author="You", type="user_message", content=transcription, elements=elements)
+    await message.send()
+    await main(message=message)
+
+
+upload_store = UploadStore()
+upload_semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+# sha256 -> future of the upload in progress, so concurrent sessions (or one
+# message attaching the same file twice) share a single upload.
+pending_uploads = {}
+
+
+async def _upload(file: Element, sha256):
+    file_id = await asyncio.to_thread(upload_store.get, sha256)
+    if file_id:
+        return file_id
+    async with upload_semaphore:
+        # An open file handle is streamed from Chainlit's temp path; a Path
+        # would be read into memory first.
+        with open(file.path, "rb") as f:
+            uploaded_file = await async_openai_client.files.create(
+                file=(file.name or Path(file.path).name, f), purpose="assistants"
+            )
+    await asyncio.to_thread(upload_store.put, sha256, uploaded_file.id, file.name, os.path.getsize(file.path))
+    return uploaded_file.id
+
+
+async def upload_file(file: Element, session_uploads):
+    sha256 = await asyncio.to_thread(file_sha256, file.path)
+    if sha256 in session_uploads:
+        return session_uploads[sha256]
+    if sha256 not in pending_uploads:
+        pending_uploads[sha256] = asyncio.ensure_future(_upload(file, sha256))
+        pending_uploads[sha256].add_done_callback(lambda _: pending_uploads.pop(sha256, None))
+    file_id = await asyncio.shield(pending_uploads[sha256])
+    session_uploads[sha256] = file_id
+    return file_id
+
+
+async def forget_uploads(file_ids):
+    session_uploads = cl.user_session.get("uploaded_files") or {}
+    for sha256, file_id in list(session_uploads.items()):
+        if file_id in file_ids:
+            del session_uploads[sha256]
+    for file_id in file_ids:
+        await asyncio.to_thread(upload_store.forget, file_id)
+
+
 async def upload_files(files: List[Element]):
-    file_ids = []
-    for file in files:
-        uploaded_file = await async_openai_client.files.create(
-            file=Path(file.path), purpose="assistants"
-        )
-        file_ids.append(uploaded_file.id)
-    return file_ids
+    # Uploads run concurrently (at most UPLOAD_CONCURRENCY at a time); files
+    # already uploaded in this session, or by anyone before, are not re-sent.
+    session_uploads = cl.user_session.get("uploaded_files") or {}
+    file_ids = await asyncio.gather(*(upload_file(file, session_uploads) for file in files))
+    cl.user_session.set("uploaded_files", session_uploads)
+    return list(dict.fromkeys(file_ids))
 
 
 async def process_files(files: List[Element]):
@@ -246,8 +248,8 @@ async def start_chat():
     assistant = await get_or_create_assistant()
     cl.user_session.set("assistant", assistant)
     config.ui.name = assistant.name
-    # Create a Thread
-    thread = await async_openai_client.beta.threads.create()
+    # Take a pre-created Thread
+    thread = await thread_pool.take()
     # Store thread ID in user session for later use
     cl.user_session.set("thread_id", thread.id)
     await cl.Message(content=f"Hello, I'm {assistant.name}!", disable_feedback=True).send()
@@ -256,18 +258,47 @@ async def start_chat():
 @cl.on_message
 async def main(message: cl.Message):
     thread_id = cl.user_session.get("thread_id")
+    assistant = cl.user_session.get("assistant")
 
     attachments = await process_files(message.elements)
 
     # Add a Message to the Thread
-    oai_message = await async_openai_client.beta.threads.messages.create(
+    try:
+        oai_message = await add_thread_message(thread_id, message.content, attachments)
+    except NotFoundError as e:
+        # A cached file_id may have been deleted or expired on the OpenAI
+        # side: forget the ones the error names and upload them again, once.
+        stale = [a["file_id"] for a in attachments if a["file_id"] in str(e)]
+        if not stale:
+            raise
+        await forget_uploads(stale)
+        attachments = await process_files(message.elements)
+        oai_message = await add_thread_message(thread_id, message.content, attachments)
+
+    # Create and Stream a Run
+    try:
+        await stream_run(thread_id, assistant)
+    except NotFoundError as e:
+        # A registered assistant deleted remotely is recreated once; an
+        # explicit OPENAI_ASSISTANT_ID is left for the operator to fix.
+        if os.environ.get("OPENAI_ASSISTANT_ID") or not is_missing_assistant(e, assistant.id):
+            raise
+        await asyncio.to_thread(assistant_registry.forget, assistant.name)
+        assistant = await get_or_create_assistant()
+        cl.user_session.set("assistant", assistant)
+        await stream_run(thread_id, assistant)
+
+
+async def add_thread_message(thread_id, content, attachments):
+    return await async_openai_client.beta.threads.messages.create(
         thread_id=thread_id,
         role="user",
-        content=message.content,
+        content=content,
         attachments=attachments,
     )
 
-    # Create and Stream a Run
+
+async def stream_run(thread_id, assistant):
     async with async_openai_client.beta.threads.runs.stream(
         thread_id=thread_id,
         assistant_id=assistant.id,
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+import chainlit as cl
+from openai import AsyncAssistantEventHandler
+from typing_extensions import override
+
+from movie_functions import get_now_playing_movies_async, get_showtimes, get_reviews_async, buy_ticket, get_movie_title_async
+from tool_runner import run_tool
+
+# Tool calls requested by an Assistants run, executed against the real
+# movie_functions. Lookups run concurrently; confirmations and purchases run
+# one at a time after them, in the order the run asked for them.
+
+PARALLEL_ASSISTANT_TOOLS = {"get_movies", "get_showtimes", "get_reviews"}
+
+
+async def execute_assistant_tool_call(name, arguments, confirm=None):
+    if name == "get_movies":
+        return await run_tool("get_movies", get_now_playing_movies_async, encoding="compact")
+    elif name == "get_showtimes":
+        # The assistant's schema passes a movie ID; SerpApi needs the title.
+        title = await get_movie_title_async(arguments["movie_id"]) or arguments["movie_id"]
+        return await run_tool("get_showtimes", get_showtimes, title, arguments["location"])
+    elif name == "get_reviews":
+        return await run_tool("get_reviews", get_reviews_async, arguments["movie_id"], encoding="compact")
+    elif name == "confirm_ticket_purchase":
+        movie, theater, showtime = arguments["movie"], arguments["theater"], arguments["showtime"]
+        if confirm and await confirm(theater, movie, showtime):
+            return f"User confirmed the movie purchase: {movie} at theater {theater} for showtime {showtime}. Proceed for purchase."
+        return f"User cancelled the movie purchase: {movie} at theater {theater} for showtime {showtime}."
+    elif name == "buy_ticket":
+        return await run_tool("buy_ticket", buy_ticket, arguments["theater"], arguments["movie"], arguments["showtime"])
+    return f"Unknown function: {name}"
+
+
+async def _tool_output(tool_call, confirm):
+    try:
+        arguments = json.loads(tool_call.function.arguments or "{}")
+        output = await execute_assistant_tool_call(tool_call.function.name, arguments, confirm)
+    except (json.JSONDecodeError, KeyError) as e:
+        output = f"Invalid arguments for {tool_call.function.name}: {e}"
+    return {"tool_call_id": tool_call.id, "output": output}
+
+
+async def execute_assistant_tool_calls(tool_calls, confirm=None):
+    # Returns tool_outputs for submit_tool_outputs, one per call, in call order.
+    tasks = {
+        tool_call.id: asyncio.ensure_future(_tool_output(tool_call, confirm))
+        for tool_call in tool_calls
+        if tool_call.function.name in PARALLEL_ASSISTANT_TOOLS
+    }
+    await asyncio.gather(*tasks.values())
+    outputs = []
+    for tool_call in tool_calls:
+        if tool_call.id in tasks:
+            outputs.append(tasks[tool_call.id].result())
+        else:
+            outputs.append(await _tool_output(tool_call, confirm))
+    return outputs
+
+
+class ChainlitEventHandler(AsyncAssistantEventHandler):
+    """Streams a run's text into Chainlit messages and answers its tool calls.
+
+    All tool outputs of a requires_action event go back in one
+    submit_tool_outputs_stream, whose continued text is relayed by a fresh
+    handler of the same kind.
+    """
+
+    def __init__(self, client, confirm=None, author=None):
+        super().__init__()
+        self.client = client
+        self.confirm = confirm
+        self.author = author
+        self.current_message = None
+
+    def _new_message(self):
+        if self.author:
+            return cl.Message(author=self.author, content="")
+        return cl.Message(content="")
+
+    @override
+    async def on_event(self, event):
+        if event.event == "thread.run.requires_action":
+            await self.handle_requires_action(event.data)
+
+    @override
+    async def on_text_created(self, text):
+        self.current_message = self._new_message()
+
+    @override
+    async def on_text_delta(self, delta, snapshot):
+        if self.current_message is None:
+            self.current_message = self._new_message()
+        await self.current_message.stream_token(delta.value or "")
+
+    @override
+    async def on_text_done(self, text):
+        if self.current_message is not None:
+            await self.current_message.send()
+
+    async def handle_requires_action(self, run):
+        tool_calls = run.required_action.submit_tool_outputs.tool_calls
+        print("Run requires action:", [tool_call.function.name for tool_call in tool_calls])
+        tool_outputs = await execute_assistant_tool_calls(tool_calls, self.confirm)
+        async with self.client.beta.threads.runs.submit_tool_outputs_stream(
+            thread_id=run.thread_id,
+            run_id=run.id,
+            tool_outputs=tool_outputs,
+            event_handler=ChainlitEventHandler(self.client, self.confirm, self.author),
+        ) as stream:
+            await stream.until_done()
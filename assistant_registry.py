@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import openai
+
+from assistant_tools import ASSISTANT_INSTRUCTIONS, ASSISTANT_MODEL, ASSISTANT_NAME, ASSISTANT_TOOLS
+
+# File locks keep workers on one host from racing to create the same
+# assistant; without fcntl (Windows) we only lock within the process.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ASSISTANT_REGISTRY_PATH = os.getenv("ASSISTANT_REGISTRY_PATH", ".cache/assistants.json")
+
+# What the apps need from an assistant, without a retrieve round trip.
+AssistantRef = namedtuple("AssistantRef", ["id", "name", "spec_hash"])
+
+
+def assistant_spec(name=ASSISTANT_NAME, model=ASSISTANT_MODEL, instructions=ASSISTANT_INSTRUCTIONS, tools=ASSISTANT_TOOLS):
+    return {"name": name, "model": model, "instructions": instructions, "tools": tools}
+
+
+def spec_hash(spec):
+    payload = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AssistantRegistry:
+    """Finds or creates one remote Assistant per spec instead of one per start.
+
+    Lookup order: this process, the JSON file at `path` (shared by workers on
+    the host), then the account's assistants tagged with our registry name in
+    their metadata (shared across hosts). The remote assistant is updated only
+    when the spec hash changes, and created only if none exists.
+    """
+
+    def __init__(self, path=ASSISTANT_REGISTRY_PATH):
+        self.path = path
+        self._refs = {}
+        self._thread_lock = threading.Lock()
+        self._async_lock = None
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._thread_lock, open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, entries):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _remember(self, entries, spec, assistant_id, digest):
+        ref = AssistantRef(assistant_id, spec["name"], digest)
+        entries[spec["name"]] = {"id": assistant_id, "spec_hash": digest}
+        self._write(entries)
+        self._refs[spec["name"]] = ref
+        return ref
+
+    @staticmethod
+    def _params(spec, digest):
+        return dict(spec, metadata={"registry_name": spec["name"], "spec_hash": digest})
+
+    @staticmethod
+    def _matches(assistant, spec):
+        return (getattr(assistant, "metadata", None) or {}).get("registry_name") == spec["name"]
+
+    def _cached(self, spec, digest):
+        ref = self._refs.get(spec["name"])
+        return ref if ref and ref.spec_hash == digest else None
+
+    def _resolve(self, spec, digest, api):
+        # Holds the file lock for the whole lookup/create. `api` runs the
+        # remote calls: find(spec) -> (id, spec_hash), create(params) -> id,
+        # update(id, params).
+        with self._locked():
+            entries = self._read()
+            entry = entries.get(spec["name"])
+            if entry and entry["spec_hash"] == digest:
+                self._refs[spec["name"]] = AssistantRef(entry["id"], spec["name"], digest)
+                return self._refs[spec["name"]]
+
+            assistant_id = entry["id"] if entry else None
+            remote_hash = None
+            if assistant_id is not None and entry["spec_hash"] != digest:
+                try:
+                    api.update(assistant_id, self._params(spec, digest))
+                    print(f"Updated assistant {spec['name']} ({assistant_id})")
+                    return self._remember(entries, spec, assistant_id, digest)
+                except openai.NotFoundError:
+                    # Deleted remotely; fall through to a lookup or create.
+                    assistant_id = None
+            if assistant_id is None:
+                assistant_id, remote_hash = api.find(spec)
+
+            if assistant_id is None:
+                assistant_id = api.create(self._params(spec, digest))
+                print(f"Created assistant {spec['name']} ({assistant_id})")
+            elif remote_hash != digest:
+                api.update(assistant_id, self._params(spec, digest))
+                print(f"Updated assistant {spec['name']} ({assistant_id})")
+            return self._remember(entries, spec, assistant_id, digest)
+
+    async def aget_or_create(self, client, spec=None):
+        # Returns the AssistantRef for `spec` using an AsyncOpenAI client.
+        # Concurrent chat starts in this process wait for one lookup. The locked section runs in one worker
+        # thread (its API calls are sent back to this loop), so cancelling the
+        # caller can't leave the lock held.
+        spec = spec or assistant_spec()
+        digest = spec_hash(spec)
+        ref = self._cached(spec, digest)
+        if ref:
+            return ref
+
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            api = _AsyncAPI(client, self._matches, asyncio.get_running_loop())
+            return self._cached(spec, digest) or await asyncio.to_thread(self._resolve, spec, digest, api)
+
+    def forget(self, name=ASSISTANT_NAME):
+        # Drop a cached id, e.g. after the assistant was deleted remotely.
+        self._refs.pop(name, None)
+        with self._locked():
+            entries = self._read()
+            if entries.pop(name, None) is not None:
+                self._write(entries)
+
+
+class _AsyncAPI:
+    # Called from the registry's worker thread; each call runs on `loop`.
+    def __init__(self, client, matches, loop):
+        self.client = client
+        self.matches = matches
+        self.loop = loop
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _find(self, spec):
+        async for assistant in self.client.beta.assistants.list(limit=100):
+            if self.matches(assistant, spec):
+                return assistant.id, assistant.metadata.get("spec_hash")
+        return None, None
+
+    async def _create(self, params):
+        return (await self.client.beta.assistants.create(**params)).id
+
+    def find(self, spec):
+        return self._run(self._find(spec))
+
+    def create(self, params):
+        return self._run(self._create(params))
+
+    def update(self, assistant_id, params):
+        self._run(self.client.beta.assistants.update(assistant_id, **params))
+
+
+assistant_registry = AssistantRegistry()
+
+
+async def get_assistant_async(client):
+    return await assistant_registry.aget_or_create(client)
+
+
+def is_missing_assistant(error, assistant_id):
+    # A not-found error about this assistant (rather than, say, the thread).
+    return isinstance(error, openai.NotFoundError) and assistant_id in str(error)
+
+
+async def with_assistant_async(client, use):
+    # Returns `await use(ref)` for the registered assistant. If the cached id
+    # was deleted remotely, it is forgotten, recreated and `use` retried once.
+    ref = await get_assistant_async(client)
+    try:
+        return await use(ref)
+    except openai.NotFoundError as e:
+        if not is_missing_assistant(e, ref.id):
+            raise
+        print(f"Assistant {ref.id} no longer exists; recreating it")
+        await asyncio.to_thread(assistant_registry.forget, ref.name)
+        return await use(await get_assistant_async(client))
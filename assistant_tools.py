@@ -0,0 +1,124 @@
+import os
+
+# The Assistants apps' shared definition. Any change here changes the spec
+# hash, and the assistant registry updates the remote Assistant to match.
+
+ASSISTANT_NAME = os.getenv("ASSISTANT_NAME", "Movie Assistant")
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL", "gpt-4o")
+
+ASSISTANT_INSTRUCTIONS = """\
+You are a helpful assistant in providing movie recommendations and helping users select movies by answering their questions and providing 
+necessary information. You are able to provide reviews, showtimes and also confirm and complete movie ticket purchases.
+
+"""
+
+ASSISTANT_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_movies",
+            "description": "Get a list of movies currently playing. For each movie, it also returns a movie ID."
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_showtimes",
+            "description": "Get the showtimes for a specific movie ID and a specific location.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {
+                        "type": "string",
+                        "description": "The city and state, e.g., San Francisco, CA"
+                    },
+                    "movie_id": {
+                        "type": "string",
+                        "description": "The ID of the movie. The ID is obtained from the get_movies() function call."
+                    }
+                },
+                "required": [
+                    "location",
+                    "movie_id"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_reviews",
+            "description": "Get the reviews for a specific movie ID.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "movie_id": {
+                        "type": "string",
+                        "description": "The ID of the movie. The ID is obtained from the get_movies() function call."
+                    }
+                },
+                "required": [
+                    "movie_id"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "confirm_ticket_purchase",
+            "description": "Confirm purchase of a movie ticket for a specific movie, theater and showtime.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "theater": {
+                        "type": "string",
+                        "description": "The name/location of the movie theater."
+                    },
+                    "movie": {
+                        "type": "string",
+                        "description": "Title of the movie."
+                    },
+                    "showtime": {
+                        "type": "string",
+                        "description": "Showtime for the movie at the given theater."
+                    }
+                },
+                "required": [
+                    "theater",
+                    "movie",
+                    "showtime"
+                ]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "buy_ticket",
+            "description": "Purchase of a movie ticket for a specific movie, theater and showtime.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "theater": {
+                        "type": "string",
+                        "description": "The name/location of the movie theater."
+                    },
+                    "movie": {
+                        "type": "string",
+                        "description": "Title of the movie."
+                    },
+                    "showtime": {
+                        "type": "string",
+                        "description": "Showtime for the movie at the given theater."
+                    }
+                },
+                "required": [
+                    "theater",
+                    "movie",
+                    "showtime"
+                ]
+            }
+        }
+    }
+]
@@ -0,0 +1,219 @@
+"""Offline component benchmarks.
+
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --baseline results.json --tolerance 0.2
+
+All network calls go to local stand-ins (benchmarks/mock_servers.py), so the
+numbers measure this code, not OpenAI/TMDb/SerpApi. Exits with status 1 when
+a metric regressed against --baseline by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+import timeit
+
+from benchmarks.fixtures import make_movies, make_reviews
+from benchmarks.harness import configure_environment, load_app, new_session, run_turn
+from benchmarks.mock_servers import MockServers
+from json_stream import extract_json
+
+CONVERSATION = [
+    "What movies are playing now?",
+    "Tell me more about Mock Movie 3.",
+    "What are the reviews saying about Mock Movie 3?",
+    "Any showtimes for Mock Movie 3 in San Francisco, CA?",
+    "Which one would you pick for a family night?",
+    "Thanks! Anything else worth seeing this week?",
+]
+
+FUNCTION_CALL_TEXT = (
+    "Sure, let me look that up for you.\n\n"
+    + json.dumps({"function_name": "get_showtimes", "movie_name": "Mock Movie 3", "location": "San Francisco, CA", "rationale": "User asked."}, indent=4)
+    + "\n\nOne moment."
+)
+PROSE_TEXT = "Mock Movie 3 is a light comedy that most critics enjoyed; the finale is the highlight. " * 4
+
+
+def per_call(func, repeat=5):
+    # Best-of-`repeat` seconds per call; autorange picks a measurable batch size.
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def metric(value, unit, better="lower"):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def bench_parsing(app):
+    results = {}
+    for name, text in (("function_call", FUNCTION_CALL_TEXT), ("prose", PROSE_TEXT)):
+        results[f"extract_json.{name}"] = metric(1 / per_call(lambda: extract_json(text)), "ops/s", "higher")
+    payload = FUNCTION_CALL_TEXT[FUNCTION_CALL_TEXT.index("{"):FUNCTION_CALL_TEXT.rindex("}") + 1]
+    results["parse_function_call"] = metric(1 / per_call(lambda: app.parse_function_call(payload)), "ops/s", "higher")
+    return results
+
+
+def bench_formatting():
+    import movie_functions
+    from tool_encoding import compact_movies, compact_reviews
+
+    movies = make_movies()
+    reviews = make_reviews(1003)["results"]
+    results = {
+        "format.movies.markdown": metric(per_call(lambda: movie_functions.format_movies_markdown(movies)) * 1e6, "us"),
+        "format.movies.compact": metric(per_call(lambda: compact_movies(movies)) * 1e6, "us"),
+        "format.reviews.markdown": metric(per_call(lambda: movie_functions.format_reviews_markdown(reviews)) * 1e6, "us"),
+        "format.reviews.compact": metric(per_call(lambda: compact_reviews(reviews)) * 1e6, "us"),
+    }
+    # End to end through the caches, after one call has warmed them.
+    movie_functions.get_now_playing_movies()
+    movie_functions.get_reviews(1003)
+    movie_functions.get_showtimes("Mock Movie 3", "San Francisco, CA")
+    results["get_now_playing_movies.cached"] = metric(per_call(movie_functions.get_now_playing_movies) * 1e6, "us")
+    results["get_reviews.cached"] = metric(per_call(lambda: movie_functions.get_reviews(1003)) * 1e6, "us")
+    results["get_showtimes.cached"] = metric(
+        per_call(lambda: movie_functions.get_showtimes("Mock Movie 3", "San Francisco, CA")) * 1e6, "us"
+    )
+    return results
+
+
+async def bench_transcription(seconds=60, packet_bytes=4096, transcribe_latency=0.05):
+    # Drives the voice path the way Chainlit does: a webm/opus recording
+    # arrives in small packets while the user talks, then the audio ends.
+    import shutil
+    import subprocess
+
+    import transcription
+
+    if not shutil.which(transcription.FFMPEG_PATH):
+        print("ffmpeg not found; skipping the transcription benchmark")
+        return {}
+    # A tone broken by short pauses, so the chunker has quiet points to cut at.
+    webm = subprocess.run(
+        [transcription.FFMPEG_PATH, "-loglevel", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=440:duration={seconds}", "-af", "volume='if(lt(mod(t,4),3.5),1,0)':eval=frame",
+         "-c:a", "libopus", "-f", "webm", "pipe:1"],
+        check=True, capture_output=True,
+    ).stdout
+
+    async def transcribe(filename, data):
+        await asyncio.sleep(transcribe_latency)
+        return filename
+
+    transcriber = transcription.EncodedStreamTranscriber(transcribe, "input_audio.webm")
+    for offset in range(0, len(webm), packet_bytes):
+        await transcriber.feed(webm[offset:offset + packet_bytes])
+        await asyncio.sleep(0)
+    chunks_while_talking = transcriber.chunks_started
+    start = time.perf_counter()
+    text = await transcriber.finish()
+    if not text.startswith("chunk-"):
+        raise RuntimeError(f"webm audio was not decoded and chunked: {text!r}")
+    return {
+        "transcribe.webm.chunks_while_talking": metric(chunks_while_talking, "chunks", "higher"),
+        "transcribe.webm.finish": metric((time.perf_counter() - start) * 1000, "ms"),
+    }
+
+
+async def bench_conversation(app, mocks, turns):
+    from tokens import count_message_tokens
+
+    await new_session(app)
+    rows = []
+    for i in range(turns):
+        calls_before = mocks.state.snapshot()["chat_completions"]
+        tokens_before = len(mocks.state.prompt_tokens)
+        seconds, recorder = await run_turn(app, CONVERSATION[i % len(CONVERSATION)])
+        rows.append({
+            "turn": i + 1,
+            "seconds": seconds,
+            "first_token_seconds": recorder.first_token,
+            "llm_calls": mocks.state.snapshot()["chat_completions"] - calls_before,
+            "prompt_tokens": sum(mocks.state.prompt_tokens[tokens_before:]),
+            "history_tokens": count_message_tokens(await app.load_message_history()),
+        })
+    return rows
+
+
+def summarize_turns(rows):
+    latencies = sorted(row["seconds"] for row in rows)
+    return {
+        "turn.latency.mean": metric(sum(latencies) / len(latencies) * 1000, "ms"),
+        "turn.latency.max": metric(latencies[-1] * 1000, "ms"),
+        "turn.llm_calls.mean": metric(sum(row["llm_calls"] for row in rows) / len(rows), "calls"),
+        "turn.prompt_tokens.mean": metric(sum(row["prompt_tokens"] for row in rows) / len(rows), "tokens"),
+        "turn.prompt_tokens.last": metric(rows[-1]["prompt_tokens"], "tokens"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, base in baseline["metrics"].items():
+        current = results["metrics"].get(name)
+        if current is None or not base["value"]:
+            continue
+        change = (current["value"] - base["value"]) / base["value"]
+        if base["better"] == "higher":
+            change = -change
+        status = "REGRESSION" if change > tolerance else "ok"
+        print(f"{status:10} {name}: {base['value']:.4g} -> {current['value']:.4g} {current['unit']} ({change:+.1%} worse)")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=12, help="turns in the simulated conversation")
+    parser.add_argument("--llm-latency", default="0", help="mock LLM time to first byte, e.g. 0.3 or uniform:0.2:0.6")
+    parser.add_argument("--token-latency", default="0", help="mock delay per streamed token")
+    parser.add_argument("--api-latency", default="0", help="mock TMDb/SerpApi latency")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="previous --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    with MockServers(
+        llm_latency=args.llm_latency,
+        token_latency=args.token_latency,
+        tmdb_latency=args.api_latency,
+        serpapi_latency=args.api_latency,
+        seed=0,
+    ) as mocks:
+        configure_environment(mocks.base_url)
+        app = load_app(mocks.base_url)
+
+        metrics = {}
+        metrics.update(bench_parsing(app))
+        metrics.update(bench_formatting())
+        metrics.update(asyncio.run(bench_transcription()))
+        turns = asyncio.run(bench_conversation(app, mocks, args.turns))
+        metrics.update(summarize_turns(turns))
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "metrics": metrics,
+        "turns": turns,
+    }
+    for name, entry in metrics.items():
+        print(f"{name:32} {entry['value']:12.4g} {entry['unit']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# Deterministic stand-in data for the TMDb and SerpApi mocks and the
+# formatting benchmarks.
+
+OVERVIEW = (
+    "When an unexpected discovery turns a quiet town upside down, an unlikely group of "
+    "friends sets out on a journey that tests their loyalty, their courage and their sense of humor. "
+)
+REVIEW_BODY = (
+    "A confident, well-paced film with strong performances and a script that mostly earns its "
+    "emotional beats. The second act drags a little, but the finale more than makes up for it. "
+)
+
+
+def make_movies(count=20):
+    return [
+        {
+            "id": 1000 + i,
+            "title": f"Mock Movie {i}",
+            "release_date": f"2024-08-{i % 28 + 1:02d}",
+            "overview": OVERVIEW * 2,
+        }
+        for i in range(count)
+    ]
+
+
+def make_reviews(movie_id, count=8):
+    return {
+        "id": movie_id,
+        "page": 1,
+        "results": [
+            {
+                "author": f"critic{i}",
+                "author_details": {"rating": 5 + i % 5},
+                "content": REVIEW_BODY * 12,
+                "created_at": "2024-08-10T12:00:00.000Z",
+                "url": f"https://www.themoviedb.org/review/{movie_id}-{i}",
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def make_showtimes(title, day="TodayOct 17"):
+    return {
+        "showtimes": [
+            {
+                "day": day,
+                "theaters": [
+                    {
+                        "name": "Mock Cinema 12",
+                        "showing": [{"time": ["1:00pm", "3:45pm", "6:30pm", "9:15pm"], "type": "Standard"}],
+                    }
+                ],
+            }
+        ]
+    }
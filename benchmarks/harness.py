@@ -0,0 +1,113 @@
+import contextvars
+import importlib
+import os
+import tempfile
+import time
+import uuid
+
+# Drives app.py outside a Chainlit server: API endpoints point at the local
+# mocks and cl.user_session / cl.Message are replaced by in-process stand-ins.
+# Shared by the benchmarks and the load generator.
+
+_session = contextvars.ContextVar("bench_session")
+_recorder = contextvars.ContextVar("bench_recorder", default=None)
+
+
+class BenchUserSession:
+    """cl.user_session backed by a per-task dict (set with new_session)."""
+
+    def get(self, key, default=None):
+        return _session.get().get(key, default)
+
+    def set(self, key, value):
+        _session.get()[key] = value
+
+
+class TurnRecorder:
+    """Collects what one turn sent to the UI, and when."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.messages = []
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+
+
+class RecordingMessage:
+    def __init__(self, content="", **kwargs):
+        self.content = content
+        self._sent = False
+
+    async def stream_token(self, token):
+        recorder = _recorder.get()
+        if recorder:
+            recorder.token()
+        self.content += token
+
+    async def send(self):
+        recorder = _recorder.get()
+        if recorder and not self._sent:
+            recorder.token()
+            recorder.messages.append(self)
+        self._sent = True
+        return self
+
+    async def update(self):
+        return self
+
+
+class ConfirmingAskActionMessage:
+    def __init__(self, content="", actions=None, **kwargs):
+        self.content = content
+
+    async def send(self):
+        return {"value": "continue"}
+
+
+def configure_environment(base_url, cache_dir=None):
+    # Must run before app / movie_functions are imported: they read these at import.
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ["OPENAI_API_KEY"] = "sk-bench"
+    os.environ["TMDB_API_BASE_URL"] = f"{base_url}/3"
+    os.environ["TMDB_API_ACCESS_TOKEN"] = "bench"
+    os.environ["SERP_API_KEY"] = "bench"
+    os.environ["REVIEW_CACHE_PATH"] = os.path.join(cache_dir, "reviews.sqlite3")
+    os.environ["SESSION_STORE_PATH"] = os.path.join(cache_dir, "sessions.sqlite3")
+    os.environ["LANGFUSE_ENABLED"] = "false"
+    os.environ["METRICS_ENABLED"] = "0"
+    os.environ.setdefault("TOKEN_SAVINGS_SAMPLE_RATE", "0")
+    return cache_dir
+
+
+def load_app(base_url):
+    """Imports app.py wired to the mocks at base_url and returns the module."""
+    import chainlit
+    from serpapi import GoogleSearch
+
+    GoogleSearch.BACKEND = base_url
+    chainlit.user_session = BenchUserSession()
+    chainlit.Message = RecordingMessage
+    chainlit.AskActionMessage = ConfirmingAskActionMessage
+    return importlib.import_module("app")
+
+
+async def new_session(app):
+    """Starts a fresh chat session in the current context (as on_chat_start would)."""
+    _session.set({"id": uuid.uuid4().hex})
+    await app.on_chat_start()
+    return _session.get()
+
+
+async def run_turn(app, text):
+    """Runs one user message through on_message; returns (seconds, recorder)."""
+    recorder = TurnRecorder()
+    token = _recorder.set(recorder)
+    try:
+        await app.on_message(RecordingMessage(content=text))
+    finally:
+        _recorder.reset(token)
+    return time.perf_counter() - recorder.started, recorder
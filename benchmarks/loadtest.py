@@ -0,0 +1,177 @@
+"""Multi-session load generator for app.py.
+
+    python -m benchmarks.loadtest --sessions 50 --duration 60 \\
+        --llm-latency lognormal:-0.9:0.4 --token-latency 0.01 --api-latency uniform:0.05:0.3
+
+Replays a JSONL corpus of recorded conversations through on_message, with N
+concurrent simulated sessions in one process (as in one Chainlit worker)
+against the local stand-ins. Module-level caches are shared between sessions,
+as they would be in production. Reports throughput, turn latency percentiles
+and event-loop lag.
+
+Each corpus line is {"id": ..., "turns": ["user message", ...]}; "turns" may
+also hold {"role": "user", "content": ...} messages (other roles are skipped).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+from benchmarks.harness import configure_environment, load_app, new_session, run_turn
+from benchmarks.mock_servers import MockServers
+
+DEFAULT_CORPUS = "benchmarks/conversations.jsonl"
+
+
+def load_corpus(path):
+    conversations = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            turns = [
+                turn if isinstance(turn, str) else turn["content"]
+                for turn in record["turns"]
+                if isinstance(turn, str) or turn.get("role") == "user"
+            ]
+            if turns:
+                conversations.append({"id": record.get("id", str(len(conversations))), "turns": turns})
+    if not conversations:
+        raise ValueError(f"No conversations in {path}")
+    return conversations
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class LoadStats:
+    def __init__(self):
+        self.turn_seconds = []
+        self.first_token_seconds = []
+        self.loop_lag = []
+        self.conversations = 0
+        self.errors = 0
+        self.error_samples = []
+
+    def summary(self, elapsed):
+        def ms(value):
+            return None if value is None else value * 1000
+
+        return {
+            "elapsed_seconds": elapsed,
+            "turns": len(self.turn_seconds),
+            "conversations": self.conversations,
+            "errors": self.errors,
+            "throughput_turns_per_second": len(self.turn_seconds) / elapsed if elapsed else 0,
+            "turn_latency_ms": {name: ms(percentile(self.turn_seconds, q)) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "first_token_ms": {name: ms(percentile(self.first_token_seconds, q)) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "event_loop_lag_ms": {
+                "p50": ms(percentile(self.loop_lag, 0.5)),
+                "p99": ms(percentile(self.loop_lag, 0.99)),
+                "max": ms(max(self.loop_lag, default=None)),
+            },
+            "error_samples": self.error_samples,
+        }
+
+
+async def monitor_loop_lag(stats, interval):
+    # A task that asks to wake every `interval`; anything later than that is
+    # time the loop spent running someone else's blocking code.
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(0.0, time.perf_counter() - started - interval))
+
+
+async def run_session(app, conversations, stats, deadline, think_time, rng):
+    # One simulated user: replays conversations, each in a fresh chat session.
+    while time.perf_counter() < deadline:
+        conversation = next(conversations)
+        await new_session(app)
+        for text in conversation["turns"]:
+            if time.perf_counter() >= deadline:
+                return
+            try:
+                seconds, recorder = await run_turn(app, text)
+            except Exception as e:
+                stats.errors += 1
+                if len(stats.error_samples) < 5:
+                    stats.error_samples.append(f"{conversation['id']}: {e!r}")
+                break
+            stats.turn_seconds.append(seconds)
+            if recorder.first_token is not None:
+                stats.first_token_seconds.append(recorder.first_token)
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, 2 * think_time))
+        stats.conversations += 1
+
+
+async def run_load(app, corpus, sessions, duration, ramp_up, think_time, lag_interval, seed):
+    stats = LoadStats()
+    rng = random.Random(seed)
+    shuffled = list(corpus)
+    rng.shuffle(shuffled)
+    conversations = itertools.cycle(shuffled)
+    monitor = asyncio.create_task(monitor_loop_lag(stats, lag_interval))
+    started = time.perf_counter()
+    deadline = started + duration
+    tasks = []
+    for i in range(sessions):
+        # Each task gets its own copy of the context, hence its own user_session.
+        tasks.append(asyncio.create_task(run_session(app, conversations, stats, deadline, think_time, random.Random(rng.random()))))
+        if ramp_up:
+            await asyncio.sleep(ramp_up / sessions)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    monitor.cancel()
+    return stats.summary(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL file of recorded conversations")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent chat sessions")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to generate load for")
+    parser.add_argument("--ramp-up", type=float, default=0, help="seconds over which sessions are started")
+    parser.add_argument("--think-time", type=float, default=0, help="mean pause between a user's turns")
+    parser.add_argument("--llm-latency", default="lognormal:-1.2:0.4", help="mock LLM time to first byte")
+    parser.add_argument("--token-latency", default="0.005", help="mock delay per streamed token")
+    parser.add_argument("--api-latency", default="uniform:0.05:0.25", help="mock TMDb/SerpApi latency")
+    parser.add_argument("--lag-interval", type=float, default=0.05, help="event-loop lag sampling interval")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    with MockServers(
+        llm_latency=args.llm_latency,
+        token_latency=args.token_latency,
+        tmdb_latency=args.api_latency,
+        serpapi_latency=args.api_latency,
+        seed=args.seed,
+    ) as mocks:
+        configure_environment(mocks.base_url)
+        app = load_app(mocks.base_url)
+        report = asyncio.run(run_load(
+            app, corpus, args.sessions, args.duration, args.ramp_up, args.think_time, args.lag_interval, args.seed
+        ))
+        report["upstream_requests"] = mocks.state.snapshot()
+
+    report["settings"] = vars(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] and not report["turns"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
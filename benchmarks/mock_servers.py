@@ -0,0 +1,244 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fixtures import make_movies, make_reviews, make_showtimes
+
+# Local stand-ins for OpenAI chat completions, TMDb and SerpApi, so the
+# benchmarks and load tests run offline with controllable latency.
+
+
+class Latency:
+    """Latency distribution parsed from a spec string (seconds).
+
+    "0.2" or "const:0.2", "uniform:0.1:0.5", "lognormal:<mu>:<sigma>"
+    (parameters of the underlying normal, e.g. lognormal:-1.5:0.5).
+    """
+
+    def __init__(self, spec="0", seed=None):
+        self.spec = str(spec)
+        parts = self.spec.split(":")
+        if len(parts) == 1:
+            parts = ["const", parts[0]]
+        self.kind = parts[0]
+        self.params = [float(p) for p in parts[1:]]
+        self._random = random.Random(seed)
+
+    def sample(self):
+        if self.kind == "const":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._random.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            return self._random.lognormvariate(self.params[0], self.params[1])
+        raise ValueError(f"Unknown latency distribution: {self.spec}")
+
+    def sleep(self):
+        delay = self.sample()
+        if delay > 0:
+            time.sleep(delay)
+
+
+PROSE = (
+    "Here are a few thoughts based on what I found. The options currently showing cover a good "
+    "range of genres, so there should be something for everyone. Let me know if you want "
+    "showtimes, reviews or help picking a ticket. "
+)
+
+
+def _function_call(name, **arguments):
+    return json.dumps({"function_name": name, **arguments, "rationale": "Needed to answer the user."}, indent=4)
+
+
+REVIEW_QUESTION = re.compile(r"\b(reviews?|critics?|ratings?|any good|worth|think of|opinions?)\b")
+
+
+def mock_review_decision(digest):
+    # Follows the intent prompt's rules on the rendered ConversationDigest:
+    # fetch only when the latest user message asks what people think of the
+    # current movie and its reviews haven't been provided yet.
+    current = re.search(r"^Current movie: (.+) \(id (\S+)\)$", digest, re.M)
+    reviewed = re.search(r"^Reviews already provided for ids: (.+)$", digest, re.M)
+    user_turns = re.findall(r"^- (.*)$", digest, re.M)
+    movie, movie_id = current.groups() if current else (None, None)
+    asks = bool(user_turns) and REVIEW_QUESTION.search(user_turns[-1].lower()) is not None
+    already = reviewed is not None and movie_id in [i.strip() for i in reviewed.group(1).split(",")]
+    return {
+        "movie": movie,
+        "id": int(movie_id) if movie_id and movie_id.isdigit() else movie_id,
+        "fetch_reviews": bool(movie_id) and asks and not already,
+        "rationale": "mock",
+    }
+
+
+def mock_chat_reply(messages):
+    # Scripted assistant: the review-intent check gets a JSON decision, a user
+    # turn gets a function call when it obviously needs one, and a turn with
+    # fresh tool output gets prose.
+    if "decide whether to fetch reviews" in messages[0]["content"]:
+        return json.dumps(mock_review_decision(messages[-1]["content"]))
+
+    last_user = max((i for i, m in enumerate(messages) if m["role"] == "user"), default=-1)
+    if any(m["role"] == "system" for m in messages[last_user + 1:]) or last_user < 0:
+        return PROSE
+    text = messages[last_user]["content"].lower()
+    if "showtime" in text:
+        return _function_call("get_showtimes", movie_name="Mock Movie 1", location="San Francisco, CA")
+    if "review" in text:
+        return _function_call("get_reviews", movie_id="1001")
+    if "playing" in text or "movies" in text or "recommend" in text:
+        return _function_call("get_movies")
+    return PROSE
+
+
+class MockState:
+    def __init__(self, llm_latency="0", token_latency="0", tmdb_latency="0", serpapi_latency="0", seed=None):
+        self.llm_latency = Latency(llm_latency, seed)
+        self.token_latency = Latency(token_latency, seed)
+        self.tmdb_latency = Latency(tmdb_latency, seed)
+        self.serpapi_latency = Latency(serpapi_latency, seed)
+        self.movies = make_movies()
+        self.lock = threading.Lock()
+        self.counts = {"chat_completions": 0, "tmdb": 0, "tmdb_not_modified": 0, "serpapi": 0}
+        self.prompt_tokens = []
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        match = re.match(r".*/movie/(\d+)/reviews$", url.path)
+        if url.path.endswith("/movie/now_playing"):
+            self.state.count("tmdb")
+            self.state.tmdb_latency.sleep()
+            self._send_json({"page": 1, "results": self.state.movies})
+        elif match:
+            self.state.count("tmdb")
+            self.state.tmdb_latency.sleep()
+            etag = f'"reviews-{match.group(1)}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.state.count("tmdb_not_modified")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_json(make_reviews(int(match.group(1))), headers={"ETag": etag})
+        elif url.path.startswith("/search"):
+            self.state.count("serpapi")
+            self.state.serpapi_latency.sleep()
+            query = parse_qs(url.query).get("q", ["showtimes for Mock Movie 1"])[0]
+            self._send_json(make_showtimes(query.replace("showtimes for ", "")))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.state.count("chat_completions")
+        messages = request["messages"]
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4 + 4 * len(messages)
+        with self.state.lock:
+            self.state.prompt_tokens.append(prompt_tokens)
+        reply = mock_chat_reply(messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(reply) // 4,
+            "total_tokens": prompt_tokens + len(reply) // 4,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        self.state.llm_latency.sleep()
+        if request.get("stream"):
+            self._stream_reply(request, reply, usage)
+            return
+        self._send_json({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream_reply(self, request, reply, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(choices, **extra):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o"),
+                "choices": choices,
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for token in re.findall(r"\S*\s*", reply):
+            if not token:
+                continue
+            self.state.token_latency.sleep()
+            event([{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class MockServers:
+    """Runs one HTTP server answering for all three APIs on a background thread."""
+
+    def __init__(self, **latencies):
+        self.state = MockState(**latencies)
+        handler = type("BoundMockHandler", (MockHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-servers", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
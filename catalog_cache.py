@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "3600"))
+
+
+def catalog_digest(movies):
+    return hashlib.sha256(json.dumps(movies, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CatalogCache:
+    """Stale-while-revalidate cache for the now-playing catalog.
+
+    All methods must run on a single event loop (the shared HTTP loop).
+    Readers always get the cached list right away; once it is older than
+    `ttl`, one background refresh is started and its result replaces the
+    list when it lands. A periodic refresher keeps the list warm too.
+    """
+
+    def __init__(self, fetch, ttl=CATALOG_TTL_SECONDS):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._movies = None
+        self._fetched_at = 0.0
+        self._refresh_task = None
+        self._refresher_task = None
+        # Bumped only when a refresh returns a different catalog, so dependent
+        # caches can tell when it changed.
+        self.version = 0
+        self._digest = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def is_stale(self):
+        return time.monotonic() - self._fetched_at > self.ttl
+
+    def peek(self):
+        # Cached list (possibly stale) or None, never triggers a fetch.
+        return self._movies
+
+    async def get(self):
+        if self._movies is None:
+            self.misses += 1
+            self._start_refresher()
+            # Cold start: every concurrent caller waits on the same fetch. It is
+            # shielded so one caller timing out doesn't cancel it for the rest.
+            await asyncio.shield(self._schedule_refresh())
+            return self._movies
+        self.hits += 1
+        if self.is_stale():
+            self._schedule_refresh()
+        return self._movies
+
+    def _schedule_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+        return self._refresh_task
+
+    async def _refresh(self):
+        try:
+            movies = await self._fetch()
+        except Exception as e:
+            self.refresh_errors += 1
+            print("Catalog refresh failed:", e)
+            if self._movies is None:
+                raise
+            return
+        digest = catalog_digest(movies)
+        if digest != self._digest:
+            self._digest = digest
+            self.version += 1
+        self._movies = movies
+        self._fetched_at = time.monotonic()
+        self.refreshes += 1
+
+    def _start_refresher(self):
+        if self._refresher_task is None:
+            self._refresher_task = asyncio.ensure_future(self._refresh_periodically())
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                await asyncio.shield(self._schedule_refresh())
+            except Exception:
+                pass
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "version": self.version,
+            "age_seconds": time.monotonic() - self._fetched_at if self._movies is not None else None,
+        }
@@ -0,0 +1,100 @@
+import os
+from collections import OrderedDict, deque
+
+from review_intent import find_titles
+
+DIGEST_RECENT_USER_TURNS = int(os.getenv("DIGEST_RECENT_USER_TURNS", "3"))
+DIGEST_MAX_KNOWN_MOVIES = int(os.getenv("DIGEST_MAX_KNOWN_MOVIES", "10"))
+DIGEST_MAX_TURN_CHARS = int(os.getenv("DIGEST_MAX_TURN_CHARS", "300"))
+
+
+def _clip(text):
+    text = " ".join((text or "").split())
+    if len(text) > DIGEST_MAX_TURN_CHARS:
+        text = text[:DIGEST_MAX_TURN_CHARS].rstrip() + "..."
+    return text
+
+
+class ConversationDigest:
+    """Bounded summary of a session for the review-intent check.
+
+    Updated once per message with only that message, so its size (and the
+    cost of rendering it) stays constant however long the session runs.
+    """
+
+    def __init__(self):
+        self.current_movie = None
+        # str(movie_id) -> title, most recently mentioned last.
+        self.known_movies = OrderedDict()
+        self.reviewed_ids = set()
+        self.recent_user_turns = deque(maxlen=DIGEST_RECENT_USER_TURNS)
+        self.last_assistant_turn = None
+
+    def _remember(self, movie_id, title, current=True):
+        key = str(movie_id)
+        self.known_movies.pop(key, None)
+        self.known_movies[key] = title
+        while len(self.known_movies) > DIGEST_MAX_KNOWN_MOVIES:
+            self.known_movies.popitem(last=False)
+        if current:
+            self.current_movie = (key, title)
+
+    def observe_user(self, text, title_index):
+        self.recent_user_turns.append(_clip(text))
+        for movie_id, title in find_titles(text, title_index):
+            self._remember(movie_id, title)
+
+    def observe_assistant(self, text, title_index):
+        self.last_assistant_turn = _clip(text)
+        mentions = find_titles(text, title_index)
+        # A reply about several movies doesn't change what "it" refers to.
+        for movie_id, title in mentions:
+            self._remember(movie_id, title, current=len(mentions) == 1)
+
+    def observe_reviews(self, movie_id, title=None):
+        self.reviewed_ids.add(str(movie_id))
+        if title:
+            self._remember(movie_id, title)
+
+    def forget_reviews(self, movie_id):
+        # The reviews are no longer in the request (evicted or summarized).
+        self.reviewed_ids.discard(str(movie_id))
+
+    def to_dict(self):
+        # JSON-safe form, stored with the session (see from_dict).
+        return {
+            "current_movie": list(self.current_movie) if self.current_movie else None,
+            "known_movies": list(self.known_movies.items()),
+            "reviewed_ids": sorted(self.reviewed_ids),
+            "recent_user_turns": list(self.recent_user_turns),
+            "last_assistant_turn": self.last_assistant_turn,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls()
+        if not data:
+            return digest
+        digest.current_movie = tuple(data["current_movie"]) if data.get("current_movie") else None
+        for movie_id, title in data.get("known_movies", [])[-DIGEST_MAX_KNOWN_MOVIES:]:
+            digest.known_movies[movie_id] = title
+        digest.reviewed_ids = set(data.get("reviewed_ids", []))
+        digest.recent_user_turns.extend(data.get("recent_user_turns", []))
+        digest.last_assistant_turn = data.get("last_assistant_turn")
+        return digest
+
+    def render(self):
+        lines = []
+        if self.current_movie:
+            lines.append(f"Current movie: {self.current_movie[1]} (id {self.current_movie[0]})")
+        else:
+            lines.append("Current movie: unknown")
+        if self.known_movies:
+            lines.append("Movies mentioned: " + ", ".join(f"{title} (id {movie_id})" for movie_id, title in self.known_movies.items()))
+        if self.reviewed_ids:
+            lines.append("Reviews already provided for ids: " + ", ".join(sorted(self.reviewed_ids)))
+        if self.last_assistant_turn:
+            lines.append(f"Last assistant reply: {self.last_assistant_turn}")
+        lines.append("Recent user messages (oldest first):")
+        lines.extend(f"- {turn}" for turn in self.recent_user_turns)
+        return "\n".join(lines)
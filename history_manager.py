@@ -0,0 +1,111 @@
+import os
+
+from tokens import count_message_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "12000"))
+HISTORY_KEEP_RECENT_TURNS = int(os.getenv("HISTORY_KEEP_RECENT_TURNS", "4"))
+SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "400"))
+ROLLING_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_ROLLING_SUMMARY_MAX_CHARS", "2000"))
+# Once over budget, compact down to this fraction of it. Every compaction
+# rewrites the prompt prefix (and so misses the provider's prefix cache), so
+# it should happen in occasional large steps rather than on every turn.
+HISTORY_COMPACT_TARGET_RATIO = float(os.getenv("HISTORY_COMPACT_TARGET_RATIO", "0.75"))
+
+SUMMARY_PREFIX = "SUMMARY: "
+ROLLING_SUMMARY_PREFIX = "EARLIER CONVERSATION (summarized): "
+
+
+def summarize_tool_output(content):
+    # Compact stand-in for an old tool output or CONTEXT block: its first line
+    # plus as much of the rest as fits in SUMMARY_MAX_CHARS.
+    first_line, _, rest = content.partition("\n")
+    rest = " ".join(rest.split())
+    summary = f"{SUMMARY_PREFIX}{first_line.strip()} {rest}".strip()
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = summary[:SUMMARY_MAX_CHARS].rstrip() + f" [... {len(content)} chars summarized]"
+    return summary
+
+
+def summarize_turn(message):
+    text = " ".join((message.get("content") or "").split())
+    if len(text) > 150:
+        text = text[:150].rstrip() + "..."
+    return f"{message['role']}: {text}"
+
+
+class HistoryManager:
+    """Keeps message_history within a token budget.
+
+    The system prompt and the last `keep_recent_turns` user turns (with
+    everything after them) stay verbatim. Duplicate CONTEXT blocks are dropped,
+    older tool outputs are collapsed into short summaries, and if that isn't
+    enough the oldest turns are folded into one rolling summary message.
+    """
+
+    def __init__(self, budget=HISTORY_TOKEN_BUDGET, keep_recent_turns=HISTORY_KEEP_RECENT_TURNS,
+                 target_ratio=HISTORY_COMPACT_TARGET_RATIO):
+        self.budget = budget
+        self.keep_recent_turns = keep_recent_turns
+        self.target = int(budget * target_ratio)
+
+    def compact(self, message_history, on_summarize=None):
+        # Modifies message_history in place and returns its token count.
+        # on_summarize(content) is called with each tool output that was collapsed.
+        self._drop_duplicate_context(message_history)
+        tokens = count_message_tokens(message_history)
+        if tokens <= self.budget:
+            return tokens
+
+        boundary = self._recent_boundary(message_history)
+        for i in range(1, boundary):
+            message = message_history[i]
+            if message["role"] == "system" and not message["content"].startswith((SUMMARY_PREFIX, ROLLING_SUMMARY_PREFIX)):
+                message_history[i] = {"role": "system", "content": summarize_tool_output(message["content"])}
+                if on_summarize:
+                    on_summarize(message["content"])
+        tokens = count_message_tokens(message_history)
+
+        while tokens > self.target and self._fold_oldest_turn(message_history):
+            tokens = count_message_tokens(message_history)
+        return tokens
+
+    def _recent_boundary(self, message_history):
+        user_indexes = [i for i, message in enumerate(message_history) if message["role"] == "user"]
+        if len(user_indexes) <= self.keep_recent_turns:
+            return user_indexes[0] if user_indexes else len(message_history)
+        return user_indexes[-self.keep_recent_turns]
+
+    def _drop_duplicate_context(self, message_history):
+        # Only the latest copy of each CONTEXT block (keyed by its first line) is kept.
+        seen = set()
+        for i in range(len(message_history) - 1, 0, -1):
+            message = message_history[i]
+            if message["role"] == "system" and message["content"].startswith("CONTEXT:"):
+                key = message["content"].partition("\n")[0]
+                if key in seen:
+                    del message_history[i]
+                seen.add(key)
+
+    def _fold_oldest_turn(self, message_history):
+        # Move the oldest message outside the recent window into the rolling summary.
+        start = 1
+        if len(message_history) > 1 and message_history[1]["content"].startswith(ROLLING_SUMMARY_PREFIX):
+            start = 2
+        if start >= self._recent_boundary(message_history):
+            return False
+
+        folded = summarize_turn(message_history.pop(start))
+        if start == 2:
+            previous = message_history[1]["content"][len(ROLLING_SUMMARY_PREFIX):]
+            lines = f"{previous}\n{folded}"
+        else:
+            lines = folded
+        # Keep the most recent whole lines of the rolling summary.
+        if len(lines) > ROLLING_SUMMARY_MAX_CHARS:
+            lines = lines[-ROLLING_SUMMARY_MAX_CHARS:].partition("\n")[2]
+        summary = {"role": "system", "content": ROLLING_SUMMARY_PREFIX + lines}
+        if start == 2:
+            message_history[1] = summary
+        else:
+            message_history.insert(1, summary)
+        return True
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import threading
+
+import httpx
+
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]").
+# Fall back to HTTP/1.1 keep-alive when it isn't installed.
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+except ImportError:
+    HTTP2_ENABLED = False
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+
+# The pooled client lives on its own event loop in a daemon thread. That way
+# the same keep-alive connections are shared by async callers on any loop
+# (e.g. Chainlit's) and by the blocking sync wrappers in movie_functions.
+_loop = None
+_client = None
+_lock = threading.Lock()
+
+
+def get_http_loop():
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="http-client-loop", daemon=True)
+            thread.start()
+    return _loop
+
+
+def get_http_client():
+    # Must only be called from coroutines running on the HTTP loop.
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+async def http_get(url, headers=None):
+    return await get_http_client().get(url, headers=headers)
+
+
+def _on_http_loop():
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+async def run_async(coro):
+    # Run a coroutine on the HTTP loop and await its result from the caller's loop.
+    if _on_http_loop():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, get_http_loop()))
+
+
+def run_sync(coro):
+    # Blocking bridge for the sync API. Never call this from the HTTP loop itself.
+    return asyncio.run_coroutine_threadsafe(coro, get_http_loop()).result()
+
+
+async def _close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def close_http_client():
+    if _loop is not None:
+        run_sync(_close_client())
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import time
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", ".cache/images")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Signs the image links we hand out; every worker must use the same one. If
+# IMAGE_LINK_SECRET is unset, one is generated on first start and kept in
+# IMAGE_LINK_SECRET_PATH, so links survive restarts and work on any worker
+# sharing that directory.
+IMAGE_LINK_SECRET = os.getenv("IMAGE_LINK_SECRET")
+IMAGE_LINK_SECRET_PATH = os.getenv("IMAGE_LINK_SECRET_PATH", ".cache/image_link_secret")
+IMAGE_LINK_TTL_SECONDS = int(os.getenv("IMAGE_LINK_TTL_SECONDS", str(7 * 24 * 3600)))
+
+FILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+)
+
+
+def load_link_secret(path=IMAGE_LINK_SECRET_PATH):
+    # The secret stored at `path`, created (mode 0600) if there is none yet.
+    # Workers starting together agree on one: os.link fails if it exists.
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+    with open(path) as f:
+        return f.read().strip()
+
+
+def image_media_type(path):
+    with open(path, "rb") as f:
+        head = f.read(12)
+    for signature, media_type in _SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    return "application/octet-stream"
+
+
+class ImageCache:
+    """Bounded on-disk cache of generated images keyed by OpenAI file_id.
+
+    `fetch(file_id, path)` is a coroutine that streams the file to `path`; it
+    runs on the first request for an image and never again while the file is
+    cached. Least recently served files are deleted once the directory grows
+    past max_bytes.
+
+    Only images we handed out with issue() can be fetched: their links carry
+    an expiry and an HMAC of it and the file_id, so the route can't be used
+    to read other files in the account. The key is the only credential, as
+    the browser sends no auth with <img> requests.
+    """
+
+    def __init__(self, fetch, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES, secret=IMAGE_LINK_SECRET,
+                 ttl=IMAGE_LINK_TTL_SECONDS):
+        self.fetch = fetch
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._secret = (secret or load_link_secret()).encode("utf-8")
+        self.ttl = ttl
+        self._pending = {}
+        # Serve order in this process; breaks ties between equal mtimes.
+        self._served = {}
+        self._serve_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _sign(self, file_id, expires):
+        message = f"{file_id}\0{expires}".encode("utf-8")
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def issue(self, file_id):
+        # Returns (expires, key): the query a link to this image must carry.
+        self._path(file_id)
+        expires = int(time.time()) + self.ttl
+        return expires, self._sign(file_id, expires)
+
+    def is_issued(self, file_id, expires, key):
+        if not key or not FILE_ID_PATTERN.match(file_id) or expires < time.time():
+            return False
+        return hmac.compare_digest(self._sign(file_id, expires), key)
+
+    def _path(self, file_id):
+        if not FILE_ID_PATTERN.match(file_id):
+            raise ValueError(f"Invalid file id: {file_id!r}")
+        return os.path.join(self.directory, file_id)
+
+    async def get_path(self, file_id):
+        path = self._path(file_id)
+        self._serve_count += 1
+        self._served[path] = self._serve_count
+        if os.path.exists(path):
+            self.hits += 1
+            # mtime doubles as the last-served time for eviction.
+            os.utime(path)
+            return path
+        self.misses += 1
+        if file_id not in self._pending:
+            self._pending[file_id] = asyncio.ensure_future(self._download(file_id, path))
+            self._pending[file_id].add_done_callback(lambda _: self._pending.pop(file_id, None))
+        await asyncio.shield(self._pending[file_id])
+        return path
+
+    async def _download(self, file_id, path):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.part"
+        try:
+            await self.fetch(file_id, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        await asyncio.to_thread(self._evict, path)
+
+    def _evict(self, keep):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, self._served.get(path, 0), stat.st_size, path))
+        total = sum(entry[2] for entry in entries)
+        for _, _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            self._served.pop(path, None)
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
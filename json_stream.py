@@ -0,0 +1,194 @@
+import json
+from bisect import bisect_right
+
+WHITESPACE = " \t\r\n"
+
+
+class JSONStreamExtractor:
+    """Incremental extractor for JSON objects embedded in LLM output.
+
+    Feed it text chunks as they stream in and call close() at the end. It
+    tracks brace depth and JSON string/escape state, so nested arguments and
+    braces inside strings are handled, and it emits each top-level object as
+    soon as its closing brace arrives. A "{" that turns out not to start an
+    object (prose like ":-{", a span that fails to parse, or one still open
+    at the end) is skipped and scanning resumes just after it. ``` fences
+    outside objects are tracked so callers can tell where code-fenced output
+    begins.
+    """
+
+    def __init__(self):
+        # Chunks are kept as a list (joined only on demand) with their start offsets.
+        self._chunks = []
+        self._offsets = []
+        self.length = 0
+        # (start, end, obj) for every top-level object that parsed as JSON.
+        self.objects = []
+        self.parse_errors = 0
+        self.first_object_start = None
+        self.first_fence_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._awaiting_key = False
+        self._start = None
+        self._backticks = 0
+
+    @property
+    def text(self):
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+            self._offsets = [0]
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def in_object(self):
+        return self._depth > 0
+
+    @property
+    def pending_backticks(self):
+        # Trailing "`" or "``" that may turn out to open a ``` fence.
+        return self._backticks if self._depth == 0 and self._backticks < 3 else 0
+
+    def slice(self, start, end):
+        # text[start:end] without joining every chunk.
+        end = min(end, self.length)
+        if start >= end:
+            return ""
+        i = bisect_right(self._offsets, start) - 1
+        parts = []
+        pos = start
+        while pos < end:
+            chunk, offset = self._chunks[i], self._offsets[i]
+            parts.append(chunk[pos - offset:end - offset])
+            pos = offset + len(chunk)
+            i += 1
+        return "".join(parts)
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+        self._offsets.append(self.length)
+        self._chunks.append(chunk)
+        self.length += len(chunk)
+        new_objects = []
+        self._scan_from(chunk, self.length - len(chunk), new_objects)
+        return new_objects
+
+    def close(self):
+        # End of stream: a candidate still open was not an object; rescan past it.
+        new_objects = []
+        while self._depth > 0:
+            restart = self._abandon_candidate()
+            self._scan_from(self.slice(restart, self.length), restart, new_objects)
+        return new_objects
+
+    def _scan_from(self, text, base, new_objects):
+        while self._scan(text, base, new_objects):
+            restart = self._abandon_candidate()
+            text, base = self.slice(restart, self.length), restart
+
+    def _abandon_candidate(self):
+        # Forget the current candidate; returns where to resume scanning.
+        restart = self._start + 1
+        if self.first_object_start == self._start:
+            self.first_object_start = None
+        self._depth = 0
+        self._in_string = self._escape = self._awaiting_key = False
+        self._backticks = 0
+        self._start = None
+        return restart
+
+    def _scan(self, text, base, new_objects):
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if self._depth == 0:
+                i += 1
+                if char == "`":
+                    self._backticks += 1
+                    if self._backticks == 3 and self.first_fence_start is None:
+                        self.first_fence_start = base + i - 3
+                    continue
+                self._backticks = 0
+                if char == "{":
+                    self._depth = 1
+                    self._awaiting_key = True
+                    self._start = base + i - 1
+                    if self.first_object_start is None:
+                        self.first_object_start = self._start
+                continue
+
+            if self._awaiting_key:
+                # An object's first token is a key or its closing brace.
+                if char in WHITESPACE:
+                    i += 1
+                    continue
+                if char not in '"}':
+                    # Only whitespace was skipped, so just reread this character as prose.
+                    if self.first_object_start == self._start:
+                        self.first_object_start = None
+                    self._depth = 0
+                    self._awaiting_key = False
+                    continue
+                self._awaiting_key = False
+
+            i += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = self._parse(self._start, base + i)
+                    if obj is None:
+                        # Not an object after all: resume just after its "{".
+                        self._depth = 1
+                        return True
+                    new_objects.append(obj)
+        return False
+
+    def _parse(self, start, end):
+        try:
+            obj = json.loads(self.slice(start, end))
+        except json.JSONDecodeError:
+            self.parse_errors += 1
+            return None
+        if not isinstance(obj, dict):
+            return None
+        self.objects.append((start, end, obj))
+        return obj
+
+    def function_calls(self):
+        return [obj for _, _, obj in self.objects if "function_name" in obj]
+
+
+def _extract(text):
+    extractor = JSONStreamExtractor()
+    extractor.feed(text or "")
+    extractor.close()
+    return extractor
+
+
+def extract_function_calls(text):
+    # Every JSON object in the response that looks like a function call, in order.
+    return _extract(text).function_calls()
+
+
+def extract_json(text):
+    # First JSON object in `text` as (prefix, json_obj, postfix), with any
+    # ```json fence stripped from the prefix; (None, None, None) if there is none.
+    extractor = _extract(text)
+    if not extractor.objects:
+        return (None, None, None)
+    start, end, json_obj = extractor.objects[0]
+    prefix = text[:start].replace("```json", "")
+    return (prefix, json_obj, text[end:])
@@ -0,0 +1,143 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram, REGISTRY, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+# Aggregate, low-overhead Prometheus metrics for the chat pipeline, served on
+# their own port next to the Chainlit server. Langfuse keeps the per-call traces.
+# Each worker process serves its own metrics on the first free port from
+# METRICS_PORT up, so every worker on a host can be scraped.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_PORT_RANGE = int(os.getenv("METRICS_PORT_RANGE", "16"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+PHASE_SECONDS = Histogram(
+    "movie_agent_phase_seconds",
+    "Time spent in each phase of on_message.",
+    ["phase"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "movie_agent_llm_call_seconds",
+    "Duration of chat completion calls, by purpose.",
+    ["label"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "movie_agent_llm_first_token_seconds",
+    "Time to the first streamed token of chat completion calls.",
+    ["label"],
+    buckets=LATENCY_BUCKETS,
+)
+TOOL_SECONDS = Histogram(
+    "movie_agent_tool_seconds",
+    "Tool call duration by tool and outcome (ok, timeout, error).",
+    ["tool", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "movie_agent_cache_lookups",
+    "Cache lookups made on the request path, by cache and result.",
+    ["cache", "result"],
+)
+JSON_PARSE_ERRORS = Counter(
+    "movie_agent_json_parse_errors",
+    "Balanced {...} spans in completions that failed to parse as JSON.",
+)
+FUNCTION_CALL_ITERATIONS = Histogram(
+    "movie_agent_function_call_iterations",
+    "Function-call rounds (extra LLM round trips) per turn.",
+    buckets=(0, 1, 2, 3, 4, 6, 8, 10),
+)
+
+
+@contextmanager
+def timed(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.labels(phase).observe(time.perf_counter() - started)
+
+
+def record_llm_call(label, seconds, first_token_seconds=None):
+    LLM_CALL_SECONDS.labels(label).observe(seconds)
+    if first_token_seconds is not None:
+        LLM_FIRST_TOKEN_SECONDS.labels(label).observe(first_token_seconds)
+
+
+def record_tool(name, seconds, outcome="ok"):
+    TOOL_SECONDS.labels(name, outcome).observe(seconds)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_parse_errors(count):
+    if count:
+        JSON_PARSE_ERRORS.inc(count)
+
+
+def record_function_call_iterations(count):
+    FUNCTION_CALL_ITERATIONS.observe(count)
+
+
+class StatsCollector:
+    """Exposes the caches' own stats() dicts at scrape time.
+
+    Nothing is recorded on the request path; each scrape reads the current
+    numbers, e.g. movie_agent_stats{source="reviews",stat="hits"}.
+    """
+
+    def __init__(self):
+        self.sources = {}
+
+    def collect(self):
+        gauge = GaugeMetricFamily("movie_agent_stats", "Counters and sizes reported by cache stats().", labels=["source", "stat"])
+        for source, stats in self.sources.items():
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Metrics: stats source {source} failed:", e)
+                continue
+            for stat, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauge.add_metric([source, stat], value)
+        yield gauge
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(source, stats):
+    # `stats` is a callable returning a flat dict of numbers.
+    stats_collector.sources[source] = stats
+
+
+metrics_port = None
+
+
+def start_metrics_server():
+    # Returns the port this worker serves metrics on, or None.
+    global metrics_port
+    if metrics_port is not None or not METRICS_ENABLED:
+        return metrics_port
+    for port in range(METRICS_PORT, METRICS_PORT + METRICS_PORT_RANGE):
+        try:
+            start_http_server(port, addr=METRICS_ADDR)
+        except OSError:
+            # Taken, most likely by another worker on this host.
+            continue
+        metrics_port = port
+        print(f"Metrics available on http://{METRICS_ADDR}:{port}/metrics")
+        return port
+    print(f"Metrics server not started: ports {METRICS_PORT}-{METRICS_PORT + METRICS_PORT_RANGE - 1} are in use")
+    return None
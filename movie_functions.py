@@ -1,24 +1,39 @@
+import asyncio
 import os
-import requests
 from serpapi import GoogleSearch
-import os
+from http_client import http_get, run_async, run_sync
+from catalog_cache import CatalogCache
+from review_cache import ReviewStore
+from showtime_cache import ShowtimeCache
+from tool_encoding import compact_movies, compact_reviews, record_savings
+
+# The TMDb functions are implemented once as coroutines running on the shared
+# HTTP loop (see http_client.py). `*_async` variants are for async callers such
+# as app.py; the original sync functions block on the same path.
+
+TMDB_API_BASE_URL = os.getenv("TMDB_API_BASE_URL", "https://api.themoviedb.org/3")
+
+class TMDbError(Exception):
+    pass
 
-def get_now_playing_movies():
-    url = "https://api.themoviedb.org/3/movie/now_playing?language=en-US&page=1"
+async def _fetch_now_playing():
+    url = f"{TMDB_API_BASE_URL}/movie/now_playing?language=en-US&page=1"
     headers = {
         "Authorization": f"Bearer {os.getenv('TMDB_API_ACCESS_TOKEN')}"
     }
-    response = requests.get(url, headers=headers)
+    response = await http_get(url, headers=headers)
     
     if response.status_code != 200:
-        return f"Error fetching data: {response.status_code} - {response.reason}"
+        raise TMDbError(f"Error fetching data: {response.status_code} - {response.reason_phrase}")
     
     data = response.json()
+    return data.get('results', [])
 
-    movies = data.get('results', [])
-    if not movies:
-        return "No movies are currently playing."
+# The now-playing list changes only a few times a day, so it is served from a
+# stale-while-revalidate cache instead of hitting TMDb on every get_movies call.
+catalog_cache = CatalogCache(_fetch_now_playing)
 
+def format_movies_markdown(movies):
     formatted_movies = "The TMDb API returned these movies:\n\n"
 
     for movie in movies:
@@ -35,7 +50,59 @@ def get_now_playing_movies():
 
     return formatted_movies
 
-def get_showtimes(title, location):
+# encoding="markdown" renders for the UI; encoding="compact" is the
+# token-capped form meant to go into the prompt.
+async def _get_now_playing_movies(encoding="markdown"):
+    try:
+        movies = await catalog_cache.get()
+    except TMDbError as e:
+        return str(e)
+
+    if not movies:
+        return "No movies are currently playing."
+
+    if encoding == "compact":
+        formatted_movies = compact_movies(movies)
+        record_savings("get_movies", lambda: format_movies_markdown(movies), formatted_movies)
+        return formatted_movies
+    return format_movies_markdown(movies)
+
+async def get_now_playing_movies_async(encoding="markdown"):
+    return await run_async(_get_now_playing_movies(encoding))
+
+def get_now_playing_movies(encoding="markdown"):
+    return run_sync(_get_now_playing_movies(encoding))
+
+def get_cached_catalog():
+    # Raw now-playing results if already cached, without triggering a fetch.
+    return catalog_cache.peek()
+
+def get_catalog_version():
+    # Bumped when a catalog refresh changes the list; lets dependent caches invalidate themselves.
+    return catalog_cache.version
+
+def get_catalog_stats():
+    return catalog_cache.stats()
+
+async def _get_movie_title(movie_id):
+    try:
+        movies = await catalog_cache.get()
+    except TMDbError:
+        return None
+    for movie in movies or []:
+        if str(movie.get('id')) == str(movie_id):
+            return movie.get('title')
+    return None
+
+async def get_movie_title_async(movie_id):
+    # Title for a now-playing movie ID (None if unknown), from the cached catalog.
+    return await run_async(_get_movie_title(movie_id))
+
+# SerpApi queries are paid; identical (title, location) lookups are answered
+# from cache until the end of the showtime day SerpApi reported.
+showtime_cache = ShowtimeCache()
+
+def _search_showtimes(title, location):
     params = {
         "api_key": os.getenv('SERP_API_KEY'),
         "engine": "google",
@@ -50,9 +117,23 @@ def get_showtimes(title, location):
     results = search.get_dict()
 
     if 'showtimes' not in results:
-        return f"No showtimes found for {title} in {location}."
+        # Don't remember transient SerpApi failures as "no showtimes".
+        if 'error' not in results:
+            showtime_cache.put(title, location, None)
+        return None
 
     showtimes = results['showtimes'][0]
+    showtime_cache.put(title, location, showtimes)
+    return showtimes
+
+def get_showtimes(title, location):
+    found, showtimes = showtime_cache.get(title, location)
+    if not found:
+        showtimes = _search_showtimes(title, location)
+
+    if showtimes is None:
+        return f"No showtimes found for {title} in {location}."
+
     formatted_showtimes = f"Showtimes for {title} in {location}:\n\n"
 
     if showtimes['theaters']:
@@ -71,23 +152,50 @@ def get_showtimes(title, location):
 
     return formatted_showtimes
 
+def get_showtime_cache_stats():
+    return showtime_cache.stats()
+
 def buy_ticket(theater, movie, showtime):
     return f"Ticket purchased for {movie} at {theater} for {showtime}."
 
-def get_reviews(movie_id):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/reviews?language=en-US&page=1"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {os.getenv('TMDB_API_ACCESS_TOKEN')}"
-    }
-    response = requests.get(url, headers=headers)
-    reviews_data = response.json()
-
-    if 'results' not in reviews_data or not reviews_data['results']:
-        return "No reviews found."
+# Review bodies are large and rarely change: keep them on disk across restarts
+# and revalidate with ETag / If-Modified-Since rather than downloading again.
+# The store is SQLite, so it is used from a worker thread, never on the HTTP loop.
+review_store = ReviewStore()
+
+async def _fetch_reviews(url, headers, movie_id):
+    cached = await asyncio.to_thread(review_store.get, movie_id)
+    if cached and cached.is_fresh():
+        return cached.data
+
+    if cached:
+        review_store.revalidations += 1
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    response = await http_get(url, headers=headers)
+
+    if response.status_code == 304 and cached:
+        await asyncio.to_thread(review_store.mark_revalidated, movie_id)
+        return cached.data
+    if response.status_code != 200:
+        # Serve the last good copy rather than an error body.
+        return cached.data if cached else response.json()
 
+    reviews_data = response.json()
+    await asyncio.to_thread(
+        review_store.put,
+        movie_id,
+        reviews_data,
+        etag=response.headers.get("etag"),
+        last_modified=response.headers.get("last-modified"),
+    )
+    return reviews_data
+
+def format_reviews_markdown(reviews):
     formatted_reviews = ""
-    for review in reviews_data['results']:
+    for review in reviews:
         author = review.get('author', 'N/A')
         rating = review.get('author_details', {}).get('rating', 'N/A')
         content = review.get('content', 'N/A')
@@ -103,4 +211,30 @@ def get_reviews(movie_id):
             "----------------------------------------\n"
         )
 
-    return formatted_reviews
\ No newline at end of file
+    return formatted_reviews
+
+async def _get_reviews(movie_id, encoding="markdown"):
+    url = f"{TMDB_API_BASE_URL}/movie/{movie_id}/reviews?language=en-US&page=1"
+    headers = {
+        "accept": "application/json",
+        "Authorization": f"Bearer {os.getenv('TMDB_API_ACCESS_TOKEN')}"
+    }
+    reviews_data = await _fetch_reviews(url, headers, movie_id)
+
+    if 'results' not in reviews_data or not reviews_data['results']:
+        return "No reviews found."
+
+    if encoding == "compact":
+        formatted_reviews = compact_reviews(reviews_data['results'])
+        record_savings("get_reviews", lambda: format_reviews_markdown(reviews_data['results']), formatted_reviews)
+        return formatted_reviews
+    return format_reviews_markdown(reviews_data['results'])
+
+async def get_reviews_async(movie_id, encoding="markdown"):
+    return await run_async(_get_reviews(movie_id, encoding))
+
+def get_reviews(movie_id, encoding="markdown"):
+    return run_sync(_get_reviews(movie_id, encoding))
+
+def get_review_cache_stats():
+    return review_store.stats()
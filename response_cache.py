@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+from showtime_cache import normalize_title
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "900"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# Only conversations with at most this many user turns are cached.
+RESPONSE_CACHE_MAX_USER_TURNS = int(os.getenv("RESPONSE_CACHE_MAX_USER_TURNS", "1"))
+
+PURCHASE_PATTERN = re.compile(r"\b(buy|purchase|tickets?|book|booking|reserve|confirm|pay|seats?)\b")
+
+_CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "what're": "what are", "how's": "how is",
+    "it's": "it is", "there's": "there is", "i'd": "i would", "i'm": "i am",
+}
+
+
+def normalize_query(text):
+    text = " ".join(str(text).lower().split())
+    for contraction, expansion in _CONTRACTIONS.items():
+        text = re.sub(rf"\b{re.escape(contraction)}(?=\W|$)", expansion, text)
+    return normalize_title(text)
+
+
+class ResponseCache:
+    """TTL + LRU cache of whole turns for common opening questions.
+
+    Keyed on a fingerprint of the system prompt, generation settings, the
+    normalized short history and the now-playing catalog version. Entries
+    from an older catalog version are dropped as soon as the version changes.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._catalog_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def fingerprint(self, system_prompt, message_history, gen_kwargs, catalog_version):
+        # None when the conversation isn't eligible for caching.
+        turns = [message for message in message_history[1:] if message["role"] in ("user", "assistant")]
+        user_turns = [message for message in turns if message["role"] == "user"]
+        if not user_turns or len(user_turns) > RESPONSE_CACHE_MAX_USER_TURNS:
+            return None
+        if any(PURCHASE_PATTERN.search(message["content"].lower()) for message in user_turns):
+            return None
+        payload = json.dumps(
+            [
+                system_prompt,
+                sorted(gen_kwargs.items()),
+                [(message["role"], normalize_query(message["content"])) for message in turns],
+                catalog_version,
+            ]
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _check_catalog_version(self, catalog_version):
+        if catalog_version != self._catalog_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._catalog_version = catalog_version
+
+    def get(self, key, catalog_version):
+        self._check_catalog_version(catalog_version)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, catalog_version):
+        self._check_catalog_version(catalog_version)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH", ".cache/reviews.sqlite3")
+REVIEW_CACHE_MAX_BYTES = int(os.getenv("REVIEW_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Within this window a cached entry is served without asking TMDb at all;
+# after it, the entry is revalidated with ETag / If-Modified-Since.
+REVIEW_CACHE_MAX_AGE = float(os.getenv("REVIEW_CACHE_MAX_AGE", "3600"))
+
+
+class CachedReviews:
+    def __init__(self, movie_id, data, etag, last_modified, fetched_at):
+        self.movie_id = movie_id
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, max_age=REVIEW_CACHE_MAX_AGE):
+        return time.time() - self.fetched_at < max_age
+
+
+class ReviewStore:
+    """SQLite-backed review store keyed by movie_id, with LRU eviction by size.
+
+    Reads don't write: last_access times are kept in memory and written out
+    with the next put() or revalidation, which is when eviction needs them.
+    Blocking; call it off the event loop.
+    """
+
+    def __init__(self, path=REVIEW_CACHE_PATH, max_bytes=REVIEW_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+        # movie_id -> last read time, not yet written to last_access.
+        self._pending_access = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS reviews (
+                    movie_id TEXT PRIMARY KEY,
+                    body TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reviews_last_access ON reviews (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, movie_id):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM reviews WHERE movie_id = ?",
+                (str(movie_id),),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_access[str(movie_id)] = time.time()
+        body, etag, last_modified, fetched_at = row
+        return CachedReviews(movie_id, json.loads(body), etag, last_modified, fetched_at)
+
+    def put(self, movie_id, data, etag=None, last_modified=None):
+        body = json.dumps(data, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self._pending_access.pop(str(movie_id), None)
+            self._flush_access(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(movie_id), body, etag, last_modified, len(body), now, now),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def mark_revalidated(self, movie_id):
+        # A 304 means our copy is still current; restart its freshness window.
+        self.not_modified += 1
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            self._pending_access.pop(str(movie_id), None)
+            self._flush_access(conn)
+            conn.execute(
+                "UPDATE reviews SET fetched_at = ?, last_access = ? WHERE movie_id = ?",
+                (now, now, str(movie_id)),
+            )
+            conn.commit()
+
+    def _flush_access(self, conn):
+        # Called with the lock held, inside a write that commits.
+        if self._pending_access:
+            conn.executemany(
+                "UPDATE reviews SET last_access = ? WHERE movie_id = ?",
+                [(accessed, movie_id) for movie_id, accessed in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def _evict(self, conn):
+        # Drop least recently used entries until the store fits in max_bytes.
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM reviews").fetchone()[0]
+        while total > self.max_bytes:
+            row = conn.execute("SELECT movie_id, size FROM reviews ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM reviews WHERE movie_id = ?", (row[0],))
+            total -= row[1]
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,79 @@
+import re
+
+from showtime_cache import normalize_title
+
+# Local, deterministic pre-classifier for should_fetch_movie_reviews. It answers
+# the obvious turns itself and returns None for anything ambiguous, which is
+# then left to the LLM intent check.
+
+REVIEW_PATTERN = re.compile(
+    r"\b(reviews?|reviewed|critics?|critical|ratings?|rated|rotten|tomatometer|imdb|"
+    r"worth (it|seeing|watching)|any good|is it good|good movie|recommend|opinions?|"
+    r"what do people think|what are people saying|how is it|how was it|should i (see|watch))\b"
+)
+TRANSACTION_PATTERN = re.compile(
+    r"\b(showtimes?|show times?|tickets?|buy|purchase|book|booking|confirm|cancel|"
+    r"theaters?|theatres?|cinema|seats?|near me|tonight|tomorrow)\b"
+)
+# References to a movie mentioned earlier ("is it any good?"); only the LLM can resolve these.
+REFERENCE_PATTERN = re.compile(r"\b(it|that one|this one|the movie|that movie|this movie|the film|them|those)\b")
+
+_title_index_cache = (None, {})
+
+
+def build_title_index(movies):
+    # Normalized title -> (movie_id, title), rebuilt only when the catalog list changes.
+    global _title_index_cache
+    if not movies:
+        return {}
+    if _title_index_cache[0] is movies:
+        return _title_index_cache[1]
+    index = {}
+    for movie in movies:
+        key = normalize_title(movie.get("title", ""))
+        if len(key) >= 3:
+            index[key] = (movie.get("id"), movie.get("title"))
+    _title_index_cache = (movies, index)
+    return index
+
+
+def find_titles(text, title_index):
+    padded = f" {normalize_title(text)} "
+    found = []
+    # Longest titles first so "Alien Romulus" wins over "Alien".
+    for key in sorted(title_index, key=len, reverse=True):
+        if f" {key} " in padded and not any(key in other for other, _ in found):
+            found.append((key, title_index[key]))
+    return [match for _, match in found]
+
+
+def classify_review_intent(user_text, title_index, reviewed_ids):
+    text = normalize_title(user_text)
+    titles = find_titles(user_text, title_index)
+    wants_reviews = REVIEW_PATTERN.search(text) is not None
+
+    if not wants_reviews:
+        if TRANSACTION_PATTERN.search(text):
+            return _decision(titles, False, "Showtime or ticket request; reviews would not help.")
+        # With no catalog loaded yet an unmatched title proves nothing.
+        if title_index and not titles and not REFERENCE_PATTERN.search(text):
+            return _decision(titles, False, "No specific movie is being discussed.")
+        return None
+
+    if len(titles) != 1:
+        return None
+    movie_id, title = titles[0]
+    if str(movie_id) in reviewed_ids:
+        return _decision(titles, False, "Reviews for this movie are already in the conversation.")
+    return _decision(titles, True, "The user asked what critics think of a specific movie.")
+
+
+def _decision(titles, fetch_reviews, rationale):
+    movie_id, title = titles[0] if len(titles) == 1 else (None, None)
+    return {
+        "movie": title,
+        "id": movie_id,
+        "fetch_reviews": fetch_reviews,
+        "rationale": rationale,
+        "source": "local",
+    }
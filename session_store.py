@@ -0,0 +1,268 @@
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", ".cache/sessions.sqlite3")
+# Decoded sessions kept in this worker's memory; the rest live only in SQLite.
+SESSION_MEMORY_MAX = int(os.getenv("SESSION_MEMORY_MAX", "200"))
+# Sessions untouched for this long are dropped from memory on the next save.
+SESSION_MEMORY_IDLE_SECONDS = float(os.getenv("SESSION_MEMORY_IDLE_SECONDS", "600"))
+# Stored sessions untouched for this long are deleted.
+SESSION_STORE_MAX_AGE = float(os.getenv("SESSION_STORE_MAX_AGE", str(7 * 24 * 3600)))
+
+MAGIC = b"MH1"
+ROLE_CODES = {"system": 0, "user": 1, "assistant": 2, "tool": 3}
+ROLES = {code: role for role, code in ROLE_CODES.items()}
+OTHER_ROLE = 255
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_bytes(out, value):
+    _write_varint(out, len(value))
+    out.extend(value)
+
+
+def _read_bytes(data, pos):
+    length, pos = _read_varint(data, pos)
+    return bytes(data[pos:pos + length]), pos + length
+
+
+def encode_session(message_history, extras=None, zdict=b""):
+    """Packs message_history (plus small JSON extras) into a compact blob.
+
+    Each message is a role byte and a varint-prefixed UTF-8 content; any other
+    keys go along as JSON. The whole body is zlib-compressed, optionally with
+    a preset dictionary (e.g. the system prompt every session starts with);
+    the dictionary's CRC is stored so a changed one is detected on decode.
+    """
+    body = bytearray()
+    _write_varint(body, len(message_history))
+    for message in message_history:
+        role = message.get("role")
+        body.append(ROLE_CODES.get(role, OTHER_ROLE))
+        if role not in ROLE_CODES:
+            _write_bytes(body, str(role).encode("utf-8"))
+        content = message.get("content")
+        if content is None:
+            _write_varint(body, 0)
+        else:
+            encoded = content.encode("utf-8")
+            _write_varint(body, len(encoded) + 1)
+            body.extend(encoded)
+        rest = {key: value for key, value in message.items() if key not in ("role", "content")}
+        _write_bytes(body, json.dumps(rest, separators=(",", ":")).encode("utf-8") if rest else b"")
+    _write_bytes(body, json.dumps(extras, separators=(",", ":")).encode("utf-8") if extras else b"")
+
+    compressor = zlib.compressobj(9, zdict=zdict) if zdict else zlib.compressobj(9)
+    return MAGIC + struct.pack(">I", zlib.crc32(zdict)) + compressor.compress(bytes(body)) + compressor.flush()
+
+
+def decode_session(blob, zdict=b""):
+    # (message_history, extras); ValueError if the blob isn't ours or the dictionary changed.
+    if blob[:3] != MAGIC:
+        raise ValueError("Not an encoded session")
+    if struct.unpack(">I", blob[3:7])[0] != zlib.crc32(zdict):
+        raise ValueError("Session was encoded with a different dictionary")
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    data = decompressor.decompress(blob[7:]) + decompressor.flush()
+
+    count, pos = _read_varint(data, 0)
+    message_history = []
+    for _ in range(count):
+        code = data[pos]
+        pos += 1
+        if code == OTHER_ROLE:
+            role, pos = _read_bytes(data, pos)
+            role = role.decode("utf-8")
+        else:
+            role = ROLES[code]
+        length, pos = _read_varint(data, pos)
+        content = None
+        if length:
+            content = data[pos:pos + length - 1].decode("utf-8")
+            pos += length - 1
+        message = {"role": role, "content": content}
+        rest, pos = _read_bytes(data, pos)
+        if rest:
+            message.update(json.loads(rest))
+        message_history.append(message)
+    extras, pos = _read_bytes(data, pos)
+    return message_history, json.loads(extras) if extras else {}
+
+
+def _copy_history(message_history):
+    # Messages are replaced rather than edited in place, so copying each dict suffices.
+    return [dict(message) for message in message_history]
+
+
+class SQLiteSessionBackend:
+    """Durable tier: session_id -> (version, blob). Shared by the workers on a host."""
+
+    def __init__(self, path=SESSION_STORE_PATH, max_age=SESSION_STORE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._conn = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    body BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, session_id):
+        with self._lock:
+            return self._connect().execute(
+                "SELECT version, body FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+
+    def version(self, session_id):
+        with self._lock:
+            row = self._connect().execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, session_id, body):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                """INSERT INTO sessions VALUES (?, 1, ?, ?)
+                   ON CONFLICT(session_id) DO UPDATE SET
+                       version = version + 1, body = excluded.body, updated_at = excluded.updated_at""",
+                (session_id, body, time.time()),
+            )
+            version = conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()[0]
+            self._puts += 1
+            if self._puts % 1000 == 0:
+                conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.max_age,))
+            conn.commit()
+        return version
+
+    def delete(self, session_id):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.commit()
+
+
+class SessionStore:
+    """message_history per session: an in-memory LRU in front of a durable backend.
+
+    Every save is written through to the backend, so any worker can serve the
+    next message. A memory hit is only used if its version still matches the
+    backend's; otherwise another worker has moved the session on and the
+    blob is decoded again. Memory is bounded by max_sessions, and sessions
+    idle past idle_seconds are dropped from it as new ones are saved.
+
+    load() and save() are coroutines: backend queries run in a worker thread
+    so a busy database never stalls the event loop. Callers get (and the
+    memory tier keeps) copies, so a turn that fails before saving can't leave
+    unsaved changes in memory.
+    """
+
+    def __init__(self, backend=None, max_sessions=SESSION_MEMORY_MAX, idle_seconds=SESSION_MEMORY_IDLE_SECONDS, zdict=b""):
+        self.backend = backend or SQLiteSessionBackend()
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.zdict = zdict
+        # session_id -> (version, message_history, extras, last_used)
+        self._memory = OrderedDict()
+        self.memory_hits = 0
+        self.backend_loads = 0
+        self.evictions = 0
+        self.stored_bytes = 0
+
+    async def load(self, session_id):
+        # (message_history, extras), or (None, {}) for an unknown session.
+        entry = self._memory.get(session_id)
+        if entry is not None and entry[0] == await asyncio.to_thread(self.backend.version, session_id):
+            self.memory_hits += 1
+            self._memory[session_id] = entry[:3] + (time.monotonic(),)
+            self._memory.move_to_end(session_id)
+            return _copy_history(entry[1]), copy.deepcopy(entry[2])
+
+        row = await asyncio.to_thread(self.backend.get, session_id)
+        if row is None:
+            self._memory.pop(session_id, None)
+            return None, {}
+        self.backend_loads += 1
+        try:
+            message_history, extras = decode_session(row[1], self.zdict)
+        except ValueError as e:
+            print(f"Session {session_id} could not be decoded:", e)
+            return None, {}
+        self._remember(session_id, row[0], message_history, extras)
+        return _copy_history(message_history), copy.deepcopy(extras)
+
+    async def save(self, session_id, message_history, extras=None):
+        blob = encode_session(message_history, extras, self.zdict)
+        self.stored_bytes = len(blob)
+        version = await asyncio.to_thread(self.backend.put, session_id, blob)
+        self._remember(session_id, version, _copy_history(message_history), copy.deepcopy(extras or {}))
+        self.evict_idle()
+
+    def _remember(self, session_id, version, message_history, extras):
+        self._memory[session_id] = (version, message_history, extras, time.monotonic())
+        self._memory.move_to_end(session_id)
+        while len(self._memory) > self.max_sessions:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._memory and next(iter(self._memory.values()))[3] < cutoff:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def release(self, session_id):
+        # Drop from memory only (e.g. on disconnect); the backend keeps it.
+        self._memory.pop(session_id, None)
+
+    async def delete(self, session_id):
+        self._memory.pop(session_id, None)
+        await asyncio.to_thread(self.backend.delete, session_id)
+
+    def stats(self):
+        return {
+            "memory_sessions": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "backend_loads": self.backend_loads,
+            "evictions": self.evictions,
+            "last_stored_bytes": self.stored_bytes,
+        }
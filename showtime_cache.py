@@ -0,0 +1,170 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+SHOWTIME_CACHE_MAX_ENTRIES = int(os.getenv("SHOWTIME_CACHE_MAX_ENTRIES", "2000"))
+# Used when SerpApi's `day` can't be parsed, and for "no showtimes" answers.
+SHOWTIME_CACHE_DEFAULT_TTL = float(os.getenv("SHOWTIME_CACHE_DEFAULT_TTL", "1800"))
+SHOWTIME_CACHE_NEGATIVE_TTL = float(os.getenv("SHOWTIME_CACHE_NEGATIVE_TTL", "900"))
+
+STATE_ABBREVIATIONS = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "district of columbia": "dc",
+    "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id", "illinois": "il",
+    "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or",
+    "pennsylvania": "pa", "rhode island": "ri", "south carolina": "sc", "south dakota": "sd",
+    "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va",
+    "washington": "wa", "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+}
+STATE_CODES = set(STATE_ABBREVIATIONS.values())
+
+CITY_ALIASES = {
+    "sf": "san francisco", "san fran": "san francisco", "sfo": "san francisco",
+    "nyc": "new york", "new york city": "new york", "manhattan": "new york",
+    "la": "los angeles", "l a": "los angeles",
+    "dc": "washington", "washington dc": "washington",
+    "philly": "philadelphia", "vegas": "las vegas", "nola": "new orleans",
+}
+
+# State to assume when a well-known city is given on its own.
+CITY_STATES = {
+    "san francisco": "ca", "los angeles": "ca", "san diego": "ca", "san jose": "ca",
+    "oakland": "ca", "sacramento": "ca", "new york": "ny", "brooklyn": "ny", "chicago": "il",
+    "houston": "tx", "austin": "tx", "dallas": "tx", "san antonio": "tx", "phoenix": "az",
+    "philadelphia": "pa", "pittsburgh": "pa", "seattle": "wa", "portland": "or",
+    "boston": "ma", "miami": "fl", "orlando": "fl", "atlanta": "ga", "denver": "co",
+    "las vegas": "nv", "new orleans": "la", "detroit": "mi", "minneapolis": "mn",
+    "washington": "dc", "nashville": "tn",
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s,]")
+_WHITESPACE = re.compile(r"\s+")
+_COUNTRY_SUFFIXES = {"usa", "us", "united states", "united states of america"}
+
+
+def normalize_title(title):
+    title = _PUNCTUATION.sub(" ", str(title).lower())
+    return _WHITESPACE.sub(" ", title.replace(",", " ")).strip()
+
+
+def _split_trailing_state(words):
+    # "san francisco california" -> ("san francisco", "ca")
+    for size in (3, 2, 1):
+        if len(words) > size:
+            candidate = " ".join(words[-size:])
+            if candidate in STATE_ABBREVIATIONS:
+                return " ".join(words[:-size]), STATE_ABBREVIATIONS[candidate]
+            if size == 1 and candidate in STATE_CODES:
+                return " ".join(words[:-size]), candidate
+    return " ".join(words), None
+
+
+def normalize_location(location):
+    location = _PUNCTUATION.sub(" ", str(location).lower())
+    parts = [_WHITESPACE.sub(" ", part).strip() for part in location.split(",")]
+    parts = [part for part in parts if part and part not in _COUNTRY_SUFFIXES]
+    if not parts:
+        return ""
+
+    city, state = parts[0], None
+    if len(parts) > 1:
+        state = STATE_ABBREVIATIONS.get(parts[1], parts[1])
+    else:
+        city, state = _split_trailing_state(city.split(" "))
+
+    city = CITY_ALIASES.get(city, city)
+    if state is None:
+        state = CITY_STATES.get(city)
+    return f"{city}, {state}" if state else city
+
+
+def showtime_cache_key(title, location):
+    return (normalize_title(title), normalize_location(location))
+
+
+_DAY_PATTERN = re.compile(r"(today|tomorrow)?\s*(?:[a-z]{3})?\s*([a-z]{3})\s*(\d{1,2})$", re.IGNORECASE)
+
+
+def expiry_for_day(day, now=None):
+    # SerpApi reports days like "TodayOct 17", "TomorrowOct 18" or "SatOct 19".
+    # Entries expire at the end of that day (server local time).
+    now = now or datetime.now()
+    match = _DAY_PATTERN.search(str(day or "").strip())
+    showtime_date = None
+    if match:
+        try:
+            month = datetime.strptime(match.group(2).title(), "%b").month
+            showtime_date = now.replace(month=month, day=int(match.group(3)))
+        except ValueError:
+            showtime_date = None
+        if showtime_date and showtime_date < now - timedelta(days=180):
+            showtime_date = showtime_date.replace(year=now.year + 1)
+    elif str(day or "").lower().startswith("today"):
+        showtime_date = now
+    elif str(day or "").lower().startswith("tomorrow"):
+        showtime_date = now + timedelta(days=1)
+
+    if showtime_date is None:
+        return time.time() + SHOWTIME_CACHE_DEFAULT_TTL
+
+    end_of_day = showtime_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    if end_of_day <= now:
+        return time.time() + SHOWTIME_CACHE_DEFAULT_TTL
+    return time.time() + (end_of_day - now).total_seconds()
+
+
+class ShowtimeCache:
+    """Thread-safe LRU of SerpApi showtime results keyed by normalized (title, location)."""
+
+    def __init__(self, max_entries=SHOWTIME_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def get(self, title, location):
+        # Returns (found, showtimes); showtimes is None for a cached "no showtimes" answer.
+        key = showtime_cache_key(title, location)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, showtimes = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, showtimes
+
+    def put(self, title, location, showtimes):
+        if showtimes is None:
+            expires_at = time.time() + SHOWTIME_CACHE_NEGATIVE_TTL
+        else:
+            expires_at = expiry_for_day(showtimes.get("day"))
+        key = showtime_cache_key(title, location)
+        with self._lock:
+            self._entries[key] = (expires_at, showtimes)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+        }
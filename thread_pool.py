@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "4"))
+# Pooled threads older than this are deleted rather than handed out.
+THREAD_POOL_MAX_IDLE = float(os.getenv("THREAD_POOL_MAX_IDLE", "3600"))
+# How often expired threads are replaced while no chats are starting.
+THREAD_POOL_MAINTAIN_SECONDS = float(os.getenv("THREAD_POOL_MAINTAIN_SECONDS", "60"))
+
+
+class AssistantThreadPool:
+    """Pre-created Assistants threads, so starting a chat needs no API call.
+
+    start() fills the pool and keeps it full: a periodic task replaces
+    threads as they expire, so an idle worker still has threads ready.
+    take() pops a ready thread in O(1) and schedules a background refill;
+    only when the pool is empty does the caller wait for a create. Needs an
+    AsyncOpenAI client; all work happens on the caller's event loop.
+    """
+
+    def __init__(self, client, size=THREAD_POOL_SIZE, max_idle=THREAD_POOL_MAX_IDLE,
+                 maintain_interval=THREAD_POOL_MAINTAIN_SECONDS):
+        self.client = client
+        self.size = size
+        self.max_idle = max_idle
+        self.maintain_interval = maintain_interval
+        # (created_at, thread), oldest on the left.
+        self._threads = deque()
+        self._refill_task = None
+        self._maintain_task = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.create_errors = 0
+
+    def start(self):
+        # Call on the serving event loop at startup; safe to call again.
+        if self._maintain_task is None:
+            self._maintain_task = asyncio.ensure_future(self._maintain())
+        self.schedule_refill()
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.maintain_interval)
+            self._expire()
+            self.schedule_refill()
+
+    async def take(self):
+        # Normally already started with the server; otherwise start now.
+        self.start()
+        self._expire()
+        if self._threads:
+            self.hits += 1
+            _, thread = self._threads.popleft()
+        else:
+            self.misses += 1
+            thread = await self.client.beta.threads.create()
+        self.schedule_refill()
+        return thread
+
+    def schedule_refill(self):
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.ensure_future(self._refill())
+
+    async def _refill(self):
+        missing = self.size - len(self._threads)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(*(self.client.beta.threads.create() for _ in range(missing)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.create_errors += 1
+                print("Thread pool: create failed:", result)
+            elif len(self._threads) < self.size:
+                self._threads.append((time.monotonic(), result))
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.max_idle
+        while self._threads and self._threads[0][0] < cutoff:
+            _, thread = self._threads.popleft()
+            self.expired += 1
+            asyncio.ensure_future(self._delete(thread))
+
+    async def _delete(self, thread):
+        try:
+            await self.client.beta.threads.delete(thread.id)
+        except Exception as e:
+            print("Thread pool: delete failed:", e)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "create_errors": self.create_errors,
+            "ready": len(self._threads),
+        }
+
+
+def start_with_app(pool, app):
+    # Starts `pool` when the FastAPI app behind Chainlit starts. That app runs
+    # a lifespan handler, so on_event("startup") hooks never fire; wrap it.
+    lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan_with_pool(app):
+        async with lifespan(app) as state:
+            pool.start()
+            yield state
+
+    app.router.lifespan_context = lifespan_with_pool
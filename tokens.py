@@ -0,0 +1,82 @@
+import os
+import threading
+
+# tiktoken gives exact counts for OpenAI models; without it (or until its
+# encoding has loaded) we fall back to the usual ~4 characters per token estimate.
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TOKEN_COUNT_MODEL = os.getenv("TOKEN_COUNT_MODEL", "gpt-4o")
+
+_encoding = None
+_load_started = False
+_load_lock = threading.Lock()
+
+
+def _load_encoding():
+    global _encoding
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(TOKEN_COUNT_MODEL)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The first load downloads the BPE file; offline we keep estimating.
+        print("tiktoken encoding unavailable, estimating token counts:", e)
+        return
+    _encoding = encoding
+
+
+def preload_encoding():
+    # Loads the encoding on a background thread (once), so the download never
+    # blocks the event loop. Call at startup; count_tokens also starts it.
+    global _load_started
+    if tiktoken is None:
+        return
+    with _load_lock:
+        if _load_started:
+            return
+        _load_started = True
+    threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True).start()
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _encoding
+    if encoding is None:
+        preload_encoding()
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages):
+    # Content tokens plus the per-message overhead of the chat format.
+    return sum(count_tokens(message.get("content") or "") + 4 for message in messages) + 2
+
+
+# label -> {"calls", "prompt_tokens", "cached_tokens", "completion_tokens"}
+usage_stats = {}
+
+
+def cached_prompt_tokens(usage):
+    # usage.prompt_tokens_details.cached_tokens; older SDKs keep it in model_extra.
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None and getattr(usage, "model_extra", None):
+        details = usage.model_extra.get("prompt_tokens_details")
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def record_usage(label, usage):
+    if usage is None:
+        return
+    cached = cached_prompt_tokens(usage)
+    stats = usage_stats.setdefault(label, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0})
+    stats["calls"] += 1
+    stats["prompt_tokens"] += usage.prompt_tokens
+    stats["cached_tokens"] += cached
+    stats["completion_tokens"] += usage.completion_tokens
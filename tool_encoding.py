@@ -0,0 +1,102 @@
+import os
+import random
+
+from tokens import count_tokens
+
+# Compact, LLM-facing serialization of tool results. The markdown renderers in
+# movie_functions stay the default for anything shown in the UI.
+
+# Upper bound on the tokens one tool result may add to the prompt;
+# override with e.g. TOOL_TOKEN_CAP_GET_REVIEWS=2000.
+TOOL_TOKEN_CAPS = {
+    "get_movies": 1500,
+    "get_reviews": 1200,
+}
+for _name in TOOL_TOKEN_CAPS:
+    if os.getenv(f"TOOL_TOKEN_CAP_{_name.upper()}"):
+        TOOL_TOKEN_CAPS[_name] = int(os.getenv(f"TOOL_TOKEN_CAP_{_name.upper()}"))
+
+# Every compact encoding records its size against the markdown form in
+# characters (cheap); this fraction of calls also tokenizes both forms for
+# exact token counts, which costs far more than the encoding itself.
+TOKEN_SAVINGS_SAMPLE_RATE = float(os.getenv("TOKEN_SAVINGS_SAMPLE_RATE", "0.01"))
+
+# tool name -> {"calls", "markdown_chars", "compact_chars",
+#               "sampled_calls", "markdown_tokens", "compact_tokens"}
+encoding_stats = {}
+
+
+def truncate_text(text, max_chars):
+    text = " ".join(str(text).split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+def encode_rows(header, rows, cap_tokens):
+    # Rows are lists of short fields whose last entry is long free text. Each
+    # row's free text gets an equal share of the cap; if the result is still
+    # too big, rows are dropped from the end.
+    fixed_chars = len(header) + sum(len("|".join(str(field) for field in row[:-1])) + 2 for row in rows)
+    per_row_chars = max(40, (cap_tokens * 4 - fixed_chars) // max(len(rows), 1))
+    lines = [header] + [
+        "|".join([str(field) for field in row[:-1]] + [truncate_text(row[-1], per_row_chars)])
+        for row in rows
+    ]
+    # Each line is tokenized once; newlines are counted as a token apiece.
+    line_tokens = [count_tokens(line) for line in lines]
+    total = sum(line_tokens) + len(lines) - 1
+    omitted = 0
+    while len(lines) > 2 and total > cap_tokens:
+        lines.pop()
+        total -= line_tokens.pop() + 1
+        omitted += 1
+    if omitted:
+        lines.append(f"({omitted} more omitted)")
+    return "\n".join(lines)
+
+
+def compact_movies(movies):
+    rows = [
+        [movie.get("id", "N/A"), movie.get("title", "N/A"), movie.get("release_date", "N/A"), movie.get("overview", "")]
+        for movie in movies
+    ]
+    return encode_rows("Now playing (id|title|release_date|overview):", rows, TOOL_TOKEN_CAPS["get_movies"])
+
+
+def compact_reviews(reviews):
+    rows = [
+        [
+            review.get("author", "N/A"),
+            review.get("author_details", {}).get("rating") or "-",
+            (review.get("created_at") or "")[:10],
+            review.get("content", ""),
+        ]
+        for review in reviews
+    ]
+    return encode_rows("Reviews (author|rating|date|content):", rows, TOOL_TOKEN_CAPS["get_reviews"])
+
+
+def record_savings(tool_name, render_markdown, compact):
+    # Returns the estimated tokens saved by this call (exact when sampled).
+    markdown = render_markdown()
+    stats = encoding_stats.setdefault(tool_name, {
+        "calls": 0, "markdown_chars": 0, "compact_chars": 0,
+        "sampled_calls": 0, "markdown_tokens": 0, "compact_tokens": 0,
+    })
+    stats["calls"] += 1
+    stats["markdown_chars"] += len(markdown)
+    stats["compact_chars"] += len(compact)
+    if not TOKEN_SAVINGS_SAMPLE_RATE or random.random() >= TOKEN_SAVINGS_SAMPLE_RATE:
+        return (len(markdown) - len(compact)) // 4
+    markdown_tokens = count_tokens(markdown)
+    compact_tokens = count_tokens(compact)
+    stats["sampled_calls"] += 1
+    stats["markdown_tokens"] += markdown_tokens
+    stats["compact_tokens"] += compact_tokens
+    return markdown_tokens - compact_tokens
+
+
+def get_encoding_stats():
+    # Flat view for metrics.register_stats, e.g. get_reviews_markdown_tokens.
+    return {f"{tool_name}_{key}": value for tool_name, stats in encoding_stats.items() for key, value in stats.items()}
@@ -0,0 +1,53 @@
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import record_tool
+
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+TOOL_DEFAULT_TIMEOUT = float(os.getenv("TOOL_DEFAULT_TIMEOUT", "20"))
+
+# Per-tool timeouts in seconds; override with e.g. TOOL_TIMEOUT_GET_SHOWTIMES=30.
+TOOL_TIMEOUTS = {
+    "get_movies": 10.0,
+    "get_showtimes": 20.0,
+    "get_reviews": 10.0,
+    "buy_ticket": 15.0,
+}
+for _name in TOOL_TIMEOUTS:
+    if os.getenv(f"TOOL_TIMEOUT_{_name.upper()}"):
+        TOOL_TIMEOUTS[_name] = float(os.getenv(f"TOOL_TIMEOUT_{_name.upper()}"))
+
+# Blocking tools (SerpApi, ticketing) run here so they never stall the event
+# loop. The pool is bounded so a burst of slow calls can't spawn unbounded threads.
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+
+def get_tool_timeout(name):
+    return TOOL_TIMEOUTS.get(name, TOOL_DEFAULT_TIMEOUT)
+
+
+async def run_tool(name, func, *args, **kwargs):
+    # Await a coroutine function directly, or run a sync function on the tool
+    # pool. Timeouts and failures come back as text the LLM can relay.
+    timeout = get_tool_timeout(name)
+    if asyncio.iscoroutinefunction(func):
+        call = func(*args, **kwargs)
+    else:
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(tool_executor, functools.partial(func, *args, **kwargs))
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        record_tool(name, time.perf_counter() - started, "timeout")
+        print(f"Tool {name} timed out after {timeout:g}s")
+        return f"The {name} tool timed out after {timeout:g} seconds. Let the user know and offer to try again."
+    except Exception as e:
+        record_tool(name, time.perf_counter() - started, "error")
+        print(f"Tool {name} failed:", e)
+        return f"The {name} tool failed with an error: {e}"
+    record_tool(name, time.perf_counter() - started)
+    return result
@@ -0,0 +1,235 @@
+import asyncio
+import io
+import os
+import re
+import wave
+from array import array
+
+# Long recordings are cut into overlapping chunks at quiet points and the
+# chunks are transcribed concurrently, so the wait after the user stops talking
+# is roughly one chunk's transcription instead of the whole recording's.
+# `transcribe` is any coroutine function (filename, wav_bytes) -> text, so a
+# local stand-in can replace the Whisper API. Encoded audio (the webm/mp4 the
+# browser records) is decoded to PCM16 by an ffmpeg subprocess first.
+
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "20"))
+TRANSCRIBE_OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", "0.5"))
+# How far either side of the nominal cut point to look for silence.
+TRANSCRIBE_SILENCE_SEARCH_SECONDS = float(os.getenv("TRANSCRIBE_SILENCE_SEARCH_SECONDS", "2"))
+TRANSCRIBE_MAX_CONCURRENCY = int(os.getenv("TRANSCRIBE_MAX_CONCURRENCY", "4"))
+ENERGY_FRAME_SECONDS = 0.02
+# Words compared when removing text transcribed twice in an overlap.
+STITCH_MAX_OVERLAP_WORDS = 15
+
+SAMPLE_WIDTH = 2  # PCM16
+
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+# Whisper resamples to 16 kHz mono anyway, so decode straight to that.
+DECODE_SAMPLE_RATE = 16000
+DECODE_READ_BYTES = 64 * 1024
+
+
+def encode_wav(pcm, sample_rate, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def read_pcm16_wav(data):
+    # (pcm, sample_rate, channels) for a PCM16 WAV file, else None.
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            if wav.getsampwidth() != SAMPLE_WIDTH or wav.getcomptype() != "NONE":
+                return None
+            return wav.readframes(wav.getnframes()), wav.getframerate(), wav.getnchannels()
+    except (wave.Error, EOFError):
+        return None
+
+
+def quietest_frame(pcm, start, end, frame_bytes):
+    # Byte offset (frame aligned) of the lowest-energy frame in pcm[start:end].
+    best_offset, best_energy = start, None
+    for offset in range(start, end - frame_bytes + 1, frame_bytes):
+        samples = array("h", pcm[offset:offset + frame_bytes])
+        energy = sum(sample * sample for sample in samples)
+        if best_energy is None or energy < best_energy:
+            best_offset, best_energy = offset, energy
+    return best_offset + frame_bytes // 2 // SAMPLE_WIDTH * SAMPLE_WIDTH
+
+
+def _words(text):
+    return re.sub(r"[^\w\s']", "", text.lower()).split()
+
+
+def stitch(texts):
+    # Joins chunk transcripts in order, dropping words repeated because the
+    # chunks overlap: the longest run that ends one chunk and starts the next.
+    merged = []
+    for text in texts:
+        words = text.split()
+        if merged:
+            tail, head = _words(" ".join(merged[-STITCH_MAX_OVERLAP_WORDS:])), _words(" ".join(words[:STITCH_MAX_OVERLAP_WORDS]))
+            for size in range(min(len(tail), len(head)), 0, -1):
+                if tail[-size:] == head[:size]:
+                    words = words[size:]
+                    break
+        merged.extend(words)
+    return " ".join(merged)
+
+
+class StreamingTranscriber:
+    """Transcribes PCM16 audio in overlapping chunks while it is still arriving.
+
+    feed() buffers audio and, whenever a full chunk plus the silence search
+    window is available, starts that chunk's transcription. finish() sends
+    the remainder and returns the stitched transcript. Audio before the last
+    cut is dropped, so the buffer stays about one chunk long.
+    """
+
+    def __init__(self, transcribe, sample_rate, channels=1, chunk_seconds=TRANSCRIBE_CHUNK_SECONDS,
+                 overlap_seconds=TRANSCRIBE_OVERLAP_SECONDS, search_seconds=TRANSCRIBE_SILENCE_SEARCH_SECONDS,
+                 max_concurrency=TRANSCRIBE_MAX_CONCURRENCY):
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self.channels = channels
+        bytes_per_second = sample_rate * channels * SAMPLE_WIDTH
+        align = channels * SAMPLE_WIDTH
+        self._chunk_bytes = int(chunk_seconds * bytes_per_second) // align * align
+        self._overlap_bytes = int(overlap_seconds * bytes_per_second) // align * align
+        self._search_bytes = max(int(search_seconds * bytes_per_second) // align * align, self._overlap_bytes)
+        self._frame_bytes = max(int(ENERGY_FRAME_SECONDS * sample_rate), 1) * align
+        self._buffer = bytearray()
+        # Offset of self._buffer[0] in the whole recording, and where the next chunk's own audio starts.
+        self._buffer_start = 0
+        self._chunk_start = 0
+        self._tasks = []
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def chunks_started(self):
+        return len(self._tasks)
+
+    async def _transcribe_chunk(self, index, pcm):
+        async with self._semaphore:
+            return await self.transcribe(f"chunk-{index}.wav", encode_wav(pcm, self.sample_rate, self.channels))
+
+    def _start_chunk(self, start, end):
+        pcm = bytes(self._buffer[start - self._buffer_start:end - self._buffer_start])
+        self._tasks.append(asyncio.ensure_future(self._transcribe_chunk(len(self._tasks), pcm)))
+
+    def feed(self, pcm):
+        self._buffer.extend(pcm)
+        buffered_end = self._buffer_start + len(self._buffer)
+        while buffered_end >= self._chunk_start + self._chunk_bytes + self._search_bytes:
+            target = self._chunk_start + self._chunk_bytes
+            cut = quietest_frame(
+                self._buffer,
+                max(target - self._search_bytes - self._buffer_start, 0),
+                target + self._search_bytes - self._buffer_start,
+                self._frame_bytes,
+            ) + self._buffer_start
+            cut = cut // (self.channels * SAMPLE_WIDTH) * (self.channels * SAMPLE_WIDTH)
+            self._start_chunk(max(self._chunk_start - self._overlap_bytes, self._buffer_start), cut + self._overlap_bytes)
+            self._chunk_start = cut
+            keep_from = max(cut - self._overlap_bytes, self._buffer_start)
+            del self._buffer[:keep_from - self._buffer_start]
+            self._buffer_start = keep_from
+
+    async def finish(self):
+        buffered_end = self._buffer_start + len(self._buffer)
+        if buffered_end > self._chunk_start or not self._tasks:
+            self._start_chunk(max(self._chunk_start - self._overlap_bytes, self._buffer_start), buffered_end)
+        self._buffer = bytearray()
+        texts = await asyncio.gather(*self._tasks)
+        return stitch(text.strip() for text in texts)
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        self._buffer = bytearray()
+
+
+class EncodedStreamTranscriber:
+    """Transcribes encoded audio (webm, mp4, ...) in chunks while it arrives.
+
+    The bytes are piped through ffmpeg, which decodes them to mono PCM16 for a
+    StreamingTranscriber as they come in. Without ffmpeg, or if it can't
+    decode the stream, finish() sends the whole recording in one request.
+    """
+
+    def __init__(self, transcribe, filename, **options):
+        self.transcribe = transcribe
+        self.filename = filename
+        self._encoded = bytearray()
+        self._pcm = StreamingTranscriber(transcribe, DECODE_SAMPLE_RATE, **options)
+        self._process = None
+        self._reader = None
+        self._failed = False
+
+    @property
+    def chunks_started(self):
+        return self._pcm.chunks_started
+
+    async def _start(self):
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                FFMPEG_PATH, "-loglevel", "error", "-i", "pipe:0",
+                "-f", "s16le", "-ac", "1", "-ar", str(DECODE_SAMPLE_RATE), "pipe:1",
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            )
+        except OSError as e:
+            print(f"ffmpeg unavailable ({e}); audio will be transcribed in one request")
+            self._failed = True
+            return
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        while True:
+            pcm = await self._process.stdout.read(DECODE_READ_BYTES)
+            if not pcm:
+                return
+            self._pcm.feed(pcm)
+
+    async def feed(self, data):
+        self._encoded.extend(data)
+        if self._process is None and not self._failed:
+            await self._start()
+        if self._failed:
+            return
+        try:
+            self._process.stdin.write(data)
+            await self._process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            self._failed = True
+
+    async def finish(self):
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            await self._reader
+            if await self._process.wait() != 0:
+                self._failed = True
+        if self._failed or self._process is None:
+            self._pcm.cancel()
+            return await self.transcribe(self.filename, bytes(self._encoded))
+        return await self._pcm.finish()
+
+
+async def transcribe_audio(data, filename, transcribe, **options):
+    # PCM16 WAV input is chunked directly; anything else (webm, mp3, ...) is
+    # decoded with ffmpeg first.
+    wav = read_pcm16_wav(data)
+    if wav is None:
+        transcriber = EncodedStreamTranscriber(transcribe, filename, **options)
+        await transcriber.feed(data)
+        return await transcriber.finish()
+    pcm, sample_rate, channels = wav
+    transcriber = StreamingTranscriber(transcribe, sample_rate, channels, **options)
+    transcriber.feed(pcm)
+    return await transcriber.finish()
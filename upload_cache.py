@@ -0,0 +1,75 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+UPLOAD_CACHE_PATH = os.getenv("UPLOAD_CACHE_PATH", ".cache/uploads.sqlite3")
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_sha256(path):
+    # Streams the file, so large attachments are never held in memory.
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadStore:
+    """SQLite map of content SHA-256 -> OpenAI file_id, shared across sessions and restarts."""
+
+    def __init__(self, path=UPLOAD_CACHE_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS uploads (
+                    sha256 TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    filename TEXT,
+                    size INTEGER NOT NULL,
+                    uploaded_at REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, sha256):
+        with self._lock:
+            row = self._connect().execute("SELECT file_id FROM uploads WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, sha256, file_id, filename=None, size=0):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)",
+                (sha256, file_id, filename, size, time.time()),
+            )
+            conn.commit()
+
+    def forget(self, file_id):
+        # For file_ids that were deleted on the OpenAI side.
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM uploads WHERE file_id = ?", (file_id,))
+            conn.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}